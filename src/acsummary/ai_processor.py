@@ -1,10 +1,21 @@
-import json
+import asyncio
 import logging
+import re
 from typing import TypeAlias, Any
 import os
 
 import html2text
 import litellm
+import orjson
+from lxml import etree
+from tenacity import (
+    RetryCallState,
+    retry,
+    retry_if_exception_type,
+    stop_after_attempt,
+    wait_random_exponential,
+)
+from .analysis_cache import AnalysisCache
 from .models import Article
 from .rate_limiter import RateLimiter
 
@@ -15,40 +26,223 @@ CompletionResponse: TypeAlias = Any  # litellmの戻り値の型
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# 改行・タブを含む連続した空白
+_WHITESPACE = re.compile(r"\s+")
+
+# lxmlで解析できなかった場合のフォールバック用。
+# 設定は常に同じため、インスタンスごとに生成せずモジュールで1つだけ用意する。
+# HTML2Textは状態を持つためスレッドセーフではなく、イベントループのスレッドからのみ使用する
+_HTML2TEXT = html2text.HTML2Text()
+_HTML2TEXT.ignore_links = True
+_HTML2TEXT.ignore_images = True
+
+_GENRE_EXAMPLES = """ジャンルの例:
+- プログラミング（Python, Go, JavaScriptなど）
+- インフラ・運用（AWS, Docker, Kubernetes など）
+- 機械学習・AI
+- セキュリティ
+- 開発手法・プロジェクト管理
+- キャリア・組織
+- ライフハック
+- レビュー・トラブルシューティング
+"""
+
 
 class AnalysisError(Exception):
     """コンテンツ分析処理で発生するエラーを表すカスタム例外"""
 
 
+# 再試行すれば成功する見込みのあるエラー（レート制限、一時的なサーバーエラー、タイムアウト）
+_RETRYABLE_ERRORS: tuple[type[BaseException], ...] = (
+    litellm.RateLimitError,
+    litellm.APIConnectionError,
+    litellm.Timeout,
+    litellm.InternalServerError,
+    litellm.ServiceUnavailableError,
+    litellm.BadGatewayError,
+    asyncio.TimeoutError,
+)
+
+# 分析に失敗した記事に設定するジャンルと要約
+_FAILED_ANALYSIS = ("未分類", "要約の生成に失敗しました")
+
+
+def _log_retry(retry_state: RetryCallState) -> None:
+    """
+    AIへのリクエストを再試行する前にログを出力
+
+    Args:
+        retry_state: tenacityの再試行の状態
+    """
+    error = retry_state.outcome.exception() if retry_state.outcome else None
+    logger.warning(
+        f"AIへのリクエストに失敗したため再試行します"
+        f"（{retry_state.attempt_number}回目）: {error}"
+    )
+
+
+class _TextCollector:
+    """
+    lxmlのパーサーターゲットとして、HTMLのテキストを上限の文字数まで収集するクラス
+
+    ツリーを構築せずにイベントを受け取るため、文書の大きさによらずメモリ使用量が抑えられる
+    """
+
+    _skipped_tags: frozenset[str] = frozenset({"script", "style"})
+
+    def __init__(self, limit: int) -> None:
+        """
+        _TextCollectorの初期化
+
+        Args:
+            limit: 収集する最大文字数
+        """
+        self.limit = limit
+        self.size = 0
+        self._parts: list[str] = []
+        self._skip_depth = 0
+
+    @property
+    def is_full(self) -> bool:
+        """上限の文字数まで収集したかどうか"""
+        return self.size >= self.limit
+
+    def start(self, tag: str, attrib: Any) -> None:
+        if tag in self._skipped_tags:
+            self._skip_depth += 1
+        # 要素の境界で単語が連結されないように区切る
+        self._parts.append(" ")
+
+    def end(self, tag: str) -> None:
+        if tag in self._skipped_tags and self._skip_depth:
+            self._skip_depth -= 1
+        self._parts.append(" ")
+
+    def data(self, data: str) -> None:
+        if self._skip_depth or self.is_full:
+            return
+        self._parts.append(data)
+        self.size += len(data)
+
+    def close(self) -> str:
+        # 連続する空白を1つにまとめてから上限で切り詰める
+        return _WHITESPACE.sub(" ", "".join(self._parts)).strip()[: self.limit]
+
+
 class ContentAnalyzer:
     content_size_max: int = 524288
+    feed_chunk_size: int = 65536
+    html_probe_size: int = 2048
+
+    # プロンプトの定型部分はクラス定義時に一度だけ組み立て、
+    # 呼び出しごとには記事ごとの可変部分のみを埋め込む
+    _ARTICLE_TEMPLATE: str = """記事タイトル: {title}
+投稿者: {handle}
+投稿日: {date}
+コメント: {comment}
+
+記事本文:
+{content}"""
+    _PROMPT_TEMPLATE: str = (
+        "以下の技術ブログ記事を分析し、ジャンルと要約を生成してください。\n\n"
+        + _ARTICLE_TEMPLATE
+        + """
+
+以下の形式のJSONで出力してください:
+{{
+    "genre": "記事の主なジャンル（技術カテゴリ）を1つ選択",
+    "summary": "記事の主要なポイントを300字程度で要約"
+}}
+
+"""
+        + _GENRE_EXAMPLES
+    )
+    _SECTION_TEMPLATE: str = "### 記事 {index}\n" + _ARTICLE_TEMPLATE
+    _BATCH_PROMPT_TEMPLATE: str = (
+        """以下の{count}件の技術ブログ記事をそれぞれ分析し、ジャンルと要約を生成してください。
+
+{sections}
+
+以下の形式のJSONで出力してください。resultsには全ての記事の結果を含め、indexには記事番号を入れてください:
+{{
+    "results": [
+        {{
+            "index": 記事番号,
+            "genre": "記事の主なジャンル（技術カテゴリ）を1つ選択",
+            "summary": "記事の主要なポイントを300字程度で要約"
+        }}
+    ]
+}}
 
-    def __init__(self, api_key: str, rate_limiter: RateLimiter) -> None:
+"""
+        + _GENRE_EXAMPLES
+    )
+
+    def __init__(
+        self,
+        api_key: str,
+        rate_limiter: RateLimiter,
+        cache: AnalysisCache | None = None,
+    ) -> None:
         """
         ContentAnalyzerの初期化
 
         Args:
             api_key: Gemini APIのキー
             rate_limiter: リクエストのレート制限を管理するインスタンス
+            cache: 分析結果のキャッシュ。Noneの場合はキャッシュしない
         """
         os.environ["GEMINI_API_KEY"] = api_key
-        self.html_converter = html2text.HTML2Text()
-        self.html_converter.ignore_links = True
-        self.html_converter.ignore_images = True
         self.rate_limiter = rate_limiter
+        self.cache = cache
 
     def _clean_html_content(self, html_content: str) -> str:
         """
         HTMLコンテンツをプレーンテキストに変換し、適切な長さに調整
 
+        HTMLを少しずつパーサーに渡し、上限の文字数に達した時点で解析を打ち切る。
+        先頭部分にタグが見当たらない場合はプレーンテキストとみなし、変換せずに返す
+
         Args:
             html_content: 変換対象のHTML文字列
 
         Returns:
             変換・調整済みのプレーンテキスト
         """
-        text_content = self.html_converter.handle(html_content)
-        return text_content[: self.content_size_max]
+        # ContentProcessorで抽出済みの本文は既にプレーンテキストのため解析を省く
+        if "<" not in html_content[: self.html_probe_size]:
+            return html_content[: self.content_size_max]
+
+        try:
+            collector = _TextCollector(self.content_size_max)
+            parser = etree.HTMLParser(target=collector)
+            for start in range(0, len(html_content), self.feed_chunk_size):
+                parser.feed(html_content[start : start + self.feed_chunk_size])
+                if collector.is_full:
+                    break
+            return parser.close()
+        except Exception as e:
+            logger.warning(f"HTMLの解析に失敗したため、html2textで変換します: {e}")
+            text_content = _HTML2TEXT.handle(html_content)
+            return text_content[: self.content_size_max]
+
+    def _template_fields(self, article: Article) -> dict[str, Any]:
+        """
+        プロンプトのテンプレートに埋め込む記事情報を取得
+
+        Args:
+            article: 対象の記事
+
+        Returns:
+            テンプレートのプレースホルダ名と値の辞書
+        """
+        return {
+            "title": article.title,
+            "handle": article.handle_name,
+            "date": article.date,
+            "comment": article.summary or "なし",
+            "content": self._clean_html_content(article.content or ""),
+        }
 
     def _create_analysis_prompt(self, article: Article) -> str:
         """
@@ -60,33 +254,122 @@ class ContentAnalyzer:
         Returns:
             生成されたプロンプト文字列
         """
-        clean_content = self._clean_html_content(article.content or "")
-        return f"""以下の技術ブログ記事を分析し、ジャンルと要約を生成してください。
+        return self._PROMPT_TEMPLATE.format(**self._template_fields(article))
 
-記事タイトル: {article.title}
-投稿者: {article.handle_name}
-投稿日: {article.date}
-コメント: {article.summary if article.summary else 'なし'}
+    def _create_batch_analysis_prompt(self, articles: list[Article]) -> str:
+        """
+        複数記事をまとめて分析するためのプロンプトを生成
 
-記事本文:
-{clean_content}
+        Args:
+            articles: 分析対象の記事リスト
 
-以下の形式のJSONで出力してください:
-{{
-    "genre": "記事の主なジャンル（技術カテゴリ）を1つ選択",
-    "summary": "記事の主要なポイントを300字程度で要約"
-}}
+        Returns:
+            生成されたプロンプト文字列
+        """
+        sections = "\n\n".join(
+            self._SECTION_TEMPLATE.format(index=index, **self._template_fields(article))
+            for index, article in enumerate(articles, start=1)
+        )
+        return self._BATCH_PROMPT_TEMPLATE.format(
+            count=len(articles), sections=sections
+        )
+
+    @retry(
+        retry=retry_if_exception_type(_RETRYABLE_ERRORS),
+        wait=wait_random_exponential(multiplier=1, max=60),
+        stop=stop_after_attempt(6),
+        before_sleep=_log_retry,
+        reraise=True,
+    )
+    async def _call_api(self, prompt: str) -> CompletionResponse:
+        """
+        レート制限に従ってAIにプロンプトを送信
 
-ジャンルの例:
-- プログラミング（Python, Go, JavaScriptなど）
-- インフラ・運用（AWS, Docker, Kubernetes など）
-- 機械学習・AI
-- セキュリティ
-- 開発手法・プロジェクト管理
-- キャリア・組織
-- ライフハック
-- レビュー・トラブルシューティング
-"""
+        レート制限や一時的なサーバーエラーの場合は、ジッター付きの指数バックオフで再試行する
+
+        Args:
+            prompt: 送信するプロンプト
+
+        Returns:
+            litellmの応答
+        """
+        # 日本語主体のため、トークン数は1文字1トークンとして見積もる
+        await self.rate_limiter.acquire(len(prompt))
+
+        try:
+            response: CompletionResponse = await litellm.acompletion(
+                model="gemini/gemini-2.0-flash-exp",
+                messages=[{"role": "user", "content": prompt}],
+                response_format={"type": "json_object"},
+            )
+        except litellm.RateLimitError:
+            self.rate_limiter.on_rate_limit_error()
+            raise
+        self.rate_limiter.on_success()
+        return response
+
+    async def _request_completion(self, prompt: str) -> str:
+        """
+        AIにプロンプトを送信し、応答本文を取得
+
+        Args:
+            prompt: 送信するプロンプト
+
+        Returns:
+            AIの応答本文
+
+        Raises:
+            AnalysisError: AIからの応答が空だった場合
+        """
+        response = await self._call_api(prompt)
+
+        if (
+            not response
+            or not response.choices
+            or not response.choices[0].message.content
+        ):
+            raise AnalysisError("AIからの応答が空でした")
+
+        return response.choices[0].message.content
+
+    async def _get_cached(self, article: Article) -> tuple[str, str] | None:
+        """
+        記事の分析結果をキャッシュから取得
+
+        キャッシュはAPI呼び出しを省くためのものなので、読み込みに失敗した場合は
+        キャッシュにないものとして扱い、分析を続ける
+
+        Args:
+            article: 対象の記事
+
+        Returns:
+            ジャンルと要約のタプル。キャッシュを使わない場合・キャッシュにない場合はNone
+        """
+        if not self.cache:
+            return None
+        try:
+            return await self.cache.get(article)
+        except Exception as e:
+            logger.warning(f"キャッシュの読み込みに失敗しました: {article.url} - {e}")
+            return None
+
+    async def _set_cached(self, article: Article, genre: str, summary: str) -> None:
+        """
+        記事の分析結果をキャッシュに保存
+
+        書き込みに失敗しても分析結果は使えるため、ログを出力して無視する
+
+        Args:
+            article: 対象の記事
+            genre: 記事のジャンル
+            summary: 記事の要約
+        """
+        if not self.cache:
+            return
+        try:
+            await self.cache.set(article, genre, summary)
+        except Exception as e:
+            logger.warning(f"キャッシュの書き込みに失敗しました: {article.url} - {e}")
 
     async def analyze_content(self, article: Article) -> tuple[str, str]:
         """
@@ -101,41 +384,128 @@ class ContentAnalyzer:
         Raises:
             AnalysisError: 分析処理に失敗した場合
         """
-        try:
-            # レート制限に従ってリクエストを実行
-            await self.rate_limiter.acquire()
+        if cached := await self._get_cached(article):
+            return cached
 
-            response: CompletionResponse = await litellm.acompletion(
-                model="gemini/gemini-2.0-flash-exp",
-                messages=[
-                    {"role": "user", "content": self._create_analysis_prompt(article)}
-                ],
-                response_format={"type": "json_object"},
+        try:
+            content = await self._request_completion(
+                self._create_analysis_prompt(article)
             )
 
-            if (
-                not response
-                or not response.choices
-                or not response.choices[0].message.content
-            ):
-                raise AnalysisError("AIからの応答が空でした")
-
             try:
-                result: JsonDict = json.loads(response.choices[0].message.content)
+                result: JsonDict = orjson.loads(content)
                 genre: str | None = result.get("genre")
                 summary: str | None = result.get("summary")
 
                 if not genre or not summary:
                     raise AnalysisError("必要な情報が含まれていません")
 
+                await self._set_cached(article, genre, summary)
                 return genre, summary
 
-            except json.JSONDecodeError as e:
+            except orjson.JSONDecodeError as e:
                 raise AnalysisError(f"JSONの解析に失敗しました: {e}")
 
         except Exception as e:
             logger.error(f"記事の分析に失敗しました: {e}")
-            return "未分類", "要約の生成に失敗しました"
+            return _FAILED_ANALYSIS
+
+    async def analyze_batch(self, articles: list[Article]) -> list[tuple[str, str]]:
+        """
+        複数の記事を1回のリクエストでまとめて分析
+
+        キャッシュに分析結果がある記事はリクエストに含めない
+
+        Args:
+            articles: 分析対象の記事リスト
+
+        Returns:
+            記事リストと同じ順序の、ジャンルと要約のタプルのリスト
+
+        Raises:
+            AnalysisError: 分析処理に失敗した場合、または結果が欠けていた場合
+        """
+        results: dict[int, tuple[str, str]] = {}
+        for i, article in enumerate(articles):
+            if cached := await self._get_cached(article):
+                results[i] = cached
+
+        if pending := [i for i in range(len(articles)) if i not in results]:
+            analyzed = await self._request_batch_analysis(
+                [articles[i] for i in pending]
+            )
+            for i, (genre, summary) in zip(pending, analyzed):
+                results[i] = (genre, summary)
+                await self._set_cached(articles[i], genre, summary)
+
+        return [results[i] for i in range(len(articles))]
+
+    async def _request_batch_analysis(
+        self, articles: list[Article]
+    ) -> list[tuple[str, str]]:
+        """
+        複数の記事をまとめてAIに分析させる
+
+        Args:
+            articles: 分析対象の記事リスト
+
+        Returns:
+            記事リストと同じ順序の、ジャンルと要約のタプルのリスト
+
+        Raises:
+            AnalysisError: 分析処理に失敗した場合、または結果が欠けていた場合
+            litellm.RateLimitError: 再試行の上限までレート制限が解除されなかった場合など
+        """
+        try:
+            content = await self._request_completion(
+                self._create_batch_analysis_prompt(articles)
+            )
+            parsed: Any = orjson.loads(content)
+        except (AnalysisError, *_RETRYABLE_ERRORS):
+            # 再試行し尽くしたエラーは記事ごとに分析し直しても失敗するため、
+            # AnalysisErrorに包まず呼び出し元に伝える
+            raise
+        except orjson.JSONDecodeError as e:
+            raise AnalysisError(f"JSONの解析に失敗しました: {e}")
+        except Exception as e:
+            raise AnalysisError(f"記事の一括分析に失敗しました: {e}")
+
+        items = parsed.get("results") if isinstance(parsed, dict) else parsed
+        if not isinstance(items, list):
+            raise AnalysisError("結果の一覧が含まれていません")
+
+        results_by_index: dict[int, tuple[str, str]] = {}
+        for item in items:
+            if not isinstance(item, dict):
+                continue
+            index = item.get("index")
+            genre = item.get("genre")
+            summary = item.get("summary")
+            if isinstance(index, int) and genre and summary:
+                results_by_index[index] = (genre, summary)
+
+        try:
+            return [results_by_index[i] for i in range(1, len(articles) + 1)]
+        except KeyError as e:
+            raise AnalysisError(f"記事 {e} の分析結果が含まれていません")
+
+
+def create_analyzer(
+    api_key: str, cache: AnalysisCache | None = None
+) -> ContentAnalyzer:
+    """
+    APIの制限に合わせたRateLimiterを持つContentAnalyzerを生成
+
+    Args:
+        api_key: Gemini APIのキー
+        cache: 分析結果のキャッシュ。Noneの場合はキャッシュしない
+
+    Returns:
+        ContentAnalyzerのインスタンス
+    """
+    # Gemini 2.0 Flash（実験版）無料枠の上限に合わせて制限を設定
+    rate_limiter = RateLimiter(requests_per_minute=10, tokens_per_minute=4_000_000)
+    return ContentAnalyzer(api_key, rate_limiter, cache)
 
 
 async def process_article(analyzer: ContentAnalyzer, article: Article) -> None:
@@ -156,17 +526,32 @@ async def process_article(analyzer: ContentAnalyzer, article: Article) -> None:
         logger.error(f"記事の処理に失敗しました: {article.title} - {e}")
 
 
-async def process_articles(api_key: str, articles: list[Article]) -> None:
+async def process_batch(analyzer: ContentAnalyzer, articles: list[Article]) -> None:
     """
-    全ての記事を処理
+    複数の記事をまとめて処理し、分析結果を設定
+
+    応答の解析に失敗した場合や結果が欠けていた場合は記事ごとの分析にフォールバックする。
+    レート制限などで再試行し尽くした場合は、記事ごとに分析し直すとリクエストが
+    記事数倍に増えるため、フォールバックせずに全記事を分析失敗とする
 
     Args:
-        api_key: Gemini APIのキー
+        analyzer: 分析を行うContentAnalyzerインスタンス
         articles: 処理対象の記事リスト
     """
-    # 10秒に1リクエストの制限を設定
-    rate_limiter = RateLimiter(requests_per_period=1, period_seconds=10.0)
-    analyzer = ContentAnalyzer(api_key, rate_limiter)
-
-    for article in articles:
-        await process_article(analyzer, article)
+    try:
+        results = await analyzer.analyze_batch(articles)
+    except _RETRYABLE_ERRORS as e:
+        logger.error(f"記事の一括分析に失敗しました: {e}")
+        for article in articles:
+            article.genre, article.summary = _FAILED_ANALYSIS
+        return
+    except AnalysisError as e:
+        logger.warning(f"記事の一括分析に失敗したため、記事ごとに分析します: {e}")
+        for article in articles:
+            await process_article(analyzer, article)
+        return
+
+    for article, (genre, summary) in zip(articles, results):
+        article.genre = genre
+        article.summary = summary
+        logger.info(f"記事の分析が完了しました: {article.title}")
@@ -0,0 +1,68 @@
+import hashlib
+
+from .models import Article
+from .sqlite_store import SQLiteStore
+
+
+class AnalysisCache(SQLiteStore):
+    """記事の分析結果をSQLiteに保存し、再実行時のAPI呼び出しを省くキャッシュ"""
+
+    _schema = (
+        "CREATE TABLE IF NOT EXISTS cache"
+        " (key TEXT PRIMARY KEY, genre TEXT, summary TEXT)"
+    )
+
+    @staticmethod
+    def make_key(article: Article) -> str:
+        """
+        記事のURLと本文からキャッシュのキーを生成
+
+        本文が変わった場合は別のキーになるため、古い分析結果は使われない
+
+        Args:
+            article: 対象の記事
+
+        Returns:
+            キャッシュのキー
+        """
+        return hashlib.sha256(
+            f"{article.url}\0{article.content or ''}".encode()
+        ).hexdigest()
+
+    async def get(self, article: Article) -> tuple[str, str] | None:
+        """
+        記事の分析結果をキャッシュから取得
+
+        Args:
+            article: 対象の記事
+
+        Returns:
+            ジャンルと要約のタプル。キャッシュにない場合はNone
+
+        Raises:
+            RuntimeError: キャッシュが開かれていない場合
+        """
+        async with self._connection.execute(
+            "SELECT genre, summary FROM cache WHERE key = ?", (self.make_key(article),)
+        ) as cursor:
+            row = await cursor.fetchone()
+        return (row[0], row[1]) if row else None
+
+    async def set(self, article: Article, genre: str, summary: str) -> None:
+        """
+        記事の分析結果をキャッシュに保存
+
+        Args:
+            article: 対象の記事
+            genre: 記事のジャンル
+            summary: 記事の要約
+
+        Raises:
+            RuntimeError: キャッシュが開かれていない場合
+        """
+        db = self._connection
+        await db.execute(
+            "INSERT OR REPLACE INTO cache (key, genre, summary) VALUES (?, ?, ?)",
+            (self.make_key(article), genre, summary),
+        )
+        await db.commit()
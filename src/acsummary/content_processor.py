@@ -1,15 +1,230 @@
+import asyncio
+import codecs
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass
 import logging
-from typing import Protocol, AsyncIterator
+import multiprocessing
+import re
+from typing import NamedTuple, Protocol
 import aiohttp
-from bs4 import BeautifulSoup
-import html2text
+from lxml import etree
+import lxml.html
+from tenacity import (
+    RetryCallState,
+    retry,
+    retry_if_exception,
+    stop_after_attempt,
+    wait_random_exponential,
+)
+from .http_session import create_session
 from .models import Article
 from typing import Any
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# 改行・タブを含む連続した空白
+_WHITESPACE = re.compile(r"\s+")
+
+# XHTMLの先頭のXML宣言。lxmlはエンコーディング宣言付きの文字列を解析できない
+_XML_DECLARATION = re.compile(r"^\s*<\?xml[^>]*\?>")
+
+# 文書内の文字コード宣言（meta charset・XML宣言）。lxmlと同様に先頭部分だけを調べる
+_DECLARED_CHARSET = re.compile(rb"<meta[^>]+charset|<\?xml[^>]+encoding", re.IGNORECASE)
+_DECLARED_CHARSET_PROBE_SIZE = 4096
+
+
+class FetchedPage(NamedTuple):
+    """取得したページの本文と、HTTPヘッダーで指定された文字コード"""
+
+    body: bytes
+    charset: str | None
+
+
+def _is_retryable_fetch_error(error: BaseException) -> bool:
+    """
+    コンテンツの取得に失敗した際に再試行すべきエラーかを判定
+
+    接続エラー・タイムアウト・429や5xxのレスポンスは一時的なものとみなす
+
+    Args:
+        error: 発生した例外
+
+    Returns:
+        再試行すべき場合はTrue
+    """
+    if isinstance(error, aiohttp.ClientResponseError):
+        return error.status == 429 or error.status >= 500
+    return isinstance(error, (aiohttp.ClientConnectionError, asyncio.TimeoutError))
+
+
+def _log_fetch_retry(retry_state: RetryCallState) -> None:
+    """
+    コンテンツの取得を再試行する前にログを出力
+
+    Args:
+        retry_state: tenacityの再試行の状態
+    """
+    error = retry_state.outcome.exception() if retry_state.outcome else None
+    logger.warning(
+        f"コンテンツの取得に失敗したため再試行します"
+        f"（{retry_state.attempt_number}回目）: {error}"
+    )
+
+
+def _class_predicate(class_name: str) -> str:
+    """
+    class属性に指定したクラス名が含まれるかを判定するXPathの条件式を生成
+
+    Args:
+        class_name: 判定対象のクラス名
+
+    Returns:
+        XPathの条件式
+    """
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {class_name} ')"
+
+
+# タイトル・本文の候補を優先度の高い順に並べたXPath
+# 記事ごとに式を解釈し直さないよう、モジュールの読み込み時にコンパイルしておく
+_TITLE_XPATHS = tuple(
+    etree.XPath(xpath)
+    for xpath in ("//h1", "//title", '//meta[@property="og:title"]/@content')
+)
+_CONTENT_XPATHS = tuple(
+    etree.XPath(xpath)
+    for xpath in (
+        "//article",
+        "//main",
+        "//div[{}]".format(
+            " or ".join(
+                _class_predicate(name)
+                for name in ("content", "article", "entry-content", "post-content")
+            )
+        ),
+    )
+)
+_NON_CONTENT_XPATH = etree.XPath(".//script | .//style")
+
+
+def _canonical_charset(charset: str) -> str | None:
+    """
+    文字コード名をPythonの正式名に揃える
+
+    Args:
+        charset: 文字コード名
+
+    Returns:
+        Pythonの正式な文字コード名。Pythonが知らない名前の場合はNone
+    """
+    try:
+        return codecs.lookup(charset).name
+    except LookupError:
+        return None
+
+
+def _html_parser(html: bytes, charset: str | None) -> lxml.html.HTMLParser:
+    """
+    バイト列のHTMLを解析するパーサーを生成
+
+    HTTPヘッダーの文字コードを優先し、なければ文書内の宣言に従ってlxmlに復号させる。
+    どちらもない場合、lxmlはLatin-1とみなしてしまうためUTF-8を指定する。
+    ヘッダーの文字コード名が解釈できない場合は、指定がないものとして扱う
+
+    Args:
+        html: 解析対象のHTML
+        charset: HTTPヘッダーで指定された文字コード
+
+    Returns:
+        HTMLパーサー
+    """
+    if charset:
+        # lxmlはeuc_jpのようなPythonの正式名を知らない一方、windows-31jなどの別名も
+        # 知らないため、指定された名前で解釈できなければPythonの正式名で試す
+        for encoding in (charset, _canonical_charset(charset)):
+            if not encoding:
+                continue
+            try:
+                return lxml.html.HTMLParser(encoding=encoding)
+            except LookupError:
+                pass
+
+    if _DECLARED_CHARSET.search(html, 0, _DECLARED_CHARSET_PROBE_SIZE):
+        return lxml.html.HTMLParser()
+    return lxml.html.HTMLParser(encoding="utf-8")
+
+
+def _extract_content(html: str | bytes, charset: str | None = None) -> tuple[str, str]:
+    """
+    HTMLからタイトルと本文を抽出
+
+    Args:
+        html: 抽出対象のHTML。バイト列の場合はlxmlが復号する
+        charset: HTTPヘッダーで指定された文字コード
+
+    Returns:
+        (タイトル, 本文)のタプル
+    """
+    if isinstance(html, bytes):
+        doc = lxml.html.fromstring(html, parser=_html_parser(html, charset))
+    else:
+        doc = lxml.html.fromstring(_XML_DECLARATION.sub("", html, count=1))
+
+    # タイトルを抽出（h1, title, og:title の順で探す）
+    title = ""
+    for xpath in _TITLE_XPATHS:
+        if found := xpath(doc):
+            title_elem = found[0]
+            title = (
+                title_elem if isinstance(title_elem, str) else title_elem.text_content()
+            ).strip()
+            break
+
+    # 本文を抽出（article, main, divの順で探す）
+    content = ""
+    for xpath in _CONTENT_XPATHS:
+        if found := xpath(doc):
+            content_elem = found[0]
+            # スクリプトやスタイルは本文に含めない
+            for elem in _NON_CONTENT_XPATH(content_elem):
+                elem.drop_tree()
+            content = content_elem.text_content()
+            break
+
+    return title, content
+
+
+def _clean_content(content: str) -> str:
+    """
+    コンテンツを整形
+
+    Args:
+        content: 整形対象のコンテンツ文字列
+
+    Returns:
+        整形後のコンテンツ文字列
+    """
+    # 改行・連続する空白を1つの空白にまとめ、
+    # コンテキストウィンドウを考慮して長さを制限
+    return _WHITESPACE.sub(" ", content).strip()[:8000]
+
+
+def _parse_article(html: str | bytes, charset: str | None = None) -> tuple[str, str]:
+    """
+    HTMLからタイトルと整形済みの本文を取得
+
+    プロセスプールのワーカーから呼び出せるよう、モジュールレベルの関数として定義する
+
+    Args:
+        html: 解析対象のHTML
+        charset: HTTPヘッダーで指定された文字コード
+
+    Returns:
+        (タイトル, 整形済み本文)のタプル
+    """
+    title, content = _extract_content(html, charset)
+    return title, _clean_content(content)
+
 
 class ContentFetcher(Protocol):
     """コンテンツ取得のインターフェース"""
@@ -31,7 +246,7 @@ class ContentFetcher(Protocol):
         """
         ...
 
-    async def fetch(self, url: str) -> str:
+    async def fetch(self, url: str) -> FetchedPage:
         """
         指定URLのコンテンツを取得
 
@@ -47,11 +262,23 @@ class ContentFetcher(Protocol):
 class DefaultContentFetcher:
     """デフォルトのコンテンツ取得実装"""
 
-    def __init__(self) -> None:
-        self._session: aiohttp.ClientSession | None = None
+    # 本文の抽出に十分な先頭部分だけを読み込み、巨大なページでメモリを使い切らないようにする
+    content_size_max = 2 * 1024 * 1024
+    read_chunk_size = 65536
+
+    def __init__(self, session: aiohttp.ClientSession | None = None) -> None:
+        """
+        DefaultContentFetcherの初期化
+
+        Args:
+            session: 共有するセッション。Noneの場合は自前で作成し、終了時にクローズする
+        """
+        self._session = session
+        self._owns_session = session is None
 
     async def __aenter__(self) -> "DefaultContentFetcher":
-        self._session = aiohttp.ClientSession()
+        if self._session is None:
+            self._session = create_session()
         return self
 
     async def __aexit__(
@@ -60,14 +287,17 @@ class DefaultContentFetcher:
         exc_val: BaseException | None,
         exc_tb: Any,
     ) -> None:
-        if self._session:
+        if self._session and self._owns_session:
             await self._session.close()
             self._session = None
 
-    async def fetch(self, url: str) -> str:
+    async def fetch(self, url: str) -> FetchedPage:
         """
         指定URLのコンテンツを取得
 
+        レスポンスはチャンク単位で読み込み、content_size_maxバイトを超えた分は破棄する。
+        文字コードはmeta charsetでのみ宣言しているページもあるため、ここでは復号しない
+
         Args:
             url: 取得対象のURL
 
@@ -86,7 +316,12 @@ class DefaultContentFetcher:
 
         async with self._session.get(url) as response:
             response.raise_for_status()
-            return await response.text()
+            body = bytearray()
+            async for chunk in response.content.iter_chunked(self.read_chunk_size):
+                body += chunk
+                if len(body) >= self.content_size_max:
+                    break
+            return FetchedPage(bytes(body[: self.content_size_max]), response.charset)
 
 
 @dataclass
@@ -94,7 +329,6 @@ class ContentProcessor:
     """記事コンテンツの処理を行うクラス"""
 
     fetcher: ContentFetcher
-    converter: html2text.HTML2Text
 
     def __init__(self, fetcher: ContentFetcher | None = None) -> None:
         """
@@ -105,92 +339,94 @@ class ContentProcessor:
                     Noneの場合はDefaultContentFetcherを使用
         """
         self.fetcher = fetcher or DefaultContentFetcher()
-        self.converter = html2text.HTML2Text()
-        # リンクと画像は無視（テキストのみを抽出）
-        self.converter.ignore_links = True
-        self.converter.ignore_images = True
+        self._pool: ProcessPoolExecutor | None = None
 
-    async def process_articles(self, articles: list[Article]) -> AsyncIterator[Article]:
+    async def __aenter__(self) -> "ContentProcessor":
         """
-        記事のコンテンツを取得・処理
-
-        Args:
-            articles: 処理対象の記事リスト
+        非同期コンテキストマネージャのエントリポイント
 
-        Yields:
-            Article: コンテンツを取得・処理した記事
+        フェッチャーのセッションとHTML解析用のプロセスプールを準備する
         """
-        async with self.fetcher:
-            for article in articles:
-                try:
-                    # コンテンツを取得
-                    html_content = await self.fetcher.fetch(article.url)
-
-                    # タイトルと本文を抽出
-                    title, content = self._extract_content(html_content)
-
-                    # 記事オブジェクトを更新
-                    article.title = title
-                    article.content = self._clean_content(content)
-
-                    yield article
-
-                except Exception as e:
-                    logger.error(
-                        f"記事のコンテンツ取得に失敗しました: {article.url} - {e}"
-                    )
-                    # エラーの場合も記事は yield するが、contentは None のまま
-                    yield article
+        await self.fetcher.__aenter__()
+        # スレッドを動かしているイベントループのプロセスをforkするとデッドロックしうるため、
+        # ワーカーはforkserver（使えないWindowsではspawn）から起動する
+        start_method = (
+            "forkserver"
+            if "forkserver" in multiprocessing.get_all_start_methods()
+            else "spawn"
+        )
+        self._pool = ProcessPoolExecutor(
+            mp_context=multiprocessing.get_context(start_method)
+        )
+        return self
 
-    def _extract_content(self, html: str) -> tuple[str, str]:
+    async def __aexit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_val: BaseException | None,
+        exc_tb: Any,
+    ) -> None:
+        """
+        非同期コンテキストマネージャの終了ポイント
         """
-        HTMLからタイトルと本文を抽出
+        if self._pool:
+            # ワーカーの終了待ちでイベントループを止めないよう別スレッドで待つ
+            await asyncio.to_thread(self._pool.shutdown, cancel_futures=True)
+            self._pool = None
+        await self.fetcher.__aexit__(exc_type, exc_val, exc_tb)
+
+    @retry(
+        retry=retry_if_exception(_is_retryable_fetch_error),
+        wait=wait_random_exponential(multiplier=0.5, max=10),
+        stop=stop_after_attempt(3),
+        before_sleep=_log_fetch_retry,
+        reraise=True,
+    )
+    async def _fetch(self, url: str) -> FetchedPage:
+        """
+        フェッチャーでコンテンツを取得
+
+        一時的なエラーの場合のみ、ジッター付きの指数バックオフで再試行する
 
         Args:
-            html: 抽出対象のHTML文字列
+            url: 取得対象のURL
 
         Returns:
-            (タイトル, 本文)のタプル
+            取得したコンテンツ
         """
-        soup = BeautifulSoup(html, "html.parser")
-
-        # タイトルを抽出（h1, title の順で探す）
-        title_elem = (
-            soup.find("h1")
-            or soup.find("title")
-            or soup.find("meta", {"property": "og:title"})
-        )
-        title = title_elem.text.strip() if title_elem else ""
-
-        # 本文を抽出（article, main, divの順で探す）
-        content_elem = (
-            soup.find("article")
-            or soup.find("main")
-            or soup.find(
-                "div",
-                {"class": ["content", "article", "entry-content", "post-content"]},
-            )
-        )
-        content = content_elem.get_text() if content_elem else ""
+        return await self.fetcher.fetch(url)
 
-        return title, content
-
-    def _clean_content(self, content: str) -> str:
+    async def process_article(self, article: Article) -> Article:
         """
-        コンテンツを整形
+        1つの記事のコンテンツを取得・処理
 
         Args:
-            content: 整形対象のコンテンツ文字列
+            article: 処理対象の記事
 
         Returns:
-            整形後のコンテンツ文字列
+            コンテンツを設定した記事。取得に失敗した場合、contentはNoneのまま
+
+        Raises:
+            RuntimeError: コンテキストマネージャとして初期化されていない場合
         """
-        # HTMLをプレーンテキストに変換
-        text = self.converter.handle(content)
+        if not self._pool:
+            raise RuntimeError("ContentProcessorが初期化されていません")
+
+        try:
+            # コンテンツを取得
+            page = await self._fetch(article.url)
+
+            # HTMLの解析はCPU処理のため、GILの影響を受けないよう別プロセスで実行
+            loop = asyncio.get_running_loop()
+            title, content = await loop.run_in_executor(
+                self._pool, _parse_article, page.body, page.charset
+            )
+
+            # 記事オブジェクトを更新
+            article.title = title
+            article.content = content
 
-        # 空行の削除と行の結合
-        lines = [line.strip() for line in text.splitlines()]
-        text = " ".join(line for line in lines if line)
+        except Exception as e:
+            logger.error(f"記事のコンテンツ取得に失敗しました: {article.url} - {e}")
 
-        # コンテキストウィンドウを考慮して長さを制限
-        return text[:8000]  # GPTのコンテキストウィンドウに収まる長さ
+        return article
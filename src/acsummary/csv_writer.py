@@ -1,25 +1,67 @@
 import csv
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, TextIO
 
 from .models import Article
 
 
 class CSVWriter:
+    headers = ("日付", "ハンドルネーム", "タイトル", "ジャンル", "要約", "URL")
+
+    @staticmethod
+    def _open(output_path: str) -> TextIO:
+        """出力先のCSVファイルを開く"""
+        # 要約の長い記事が多くても書き込みのシステムコールが増えないよう
+        # 大きめのバッファを確保し、Excelで文字化けしないようBOM付きで出力
+        return open(
+            output_path, "w", newline="", encoding="utf-8-sig", buffering=1 << 20
+        )
+
     @staticmethod
-    def write_articles(articles: list[Article], output_path: str) -> None:
-        """記事情報をCSVファイルに出力"""
-        headers = ["日付", "ハンドルネーム", "タイトル", "ジャンル", "要約", "URL"]
-
-        with open(output_path, "w", newline="", encoding="utf-8") as f:
-            writer = csv.DictWriter(f, fieldnames=headers)
-            writer.writeheader()
-            for article in articles:
-                writer.writerow(
-                    {
-                        "日付": f"{article.date}",
-                        "ハンドルネーム": f"{article.handle_name}",
-                        "タイトル": f"{article.title}",
-                        "ジャンル": f"{article.genre}",
-                        "要約": f"{article.summary}",
-                        "URL": f"{article.url}",
-                    }
-                )
+    def _to_row(article: Article) -> tuple[Any, ...]:
+        """記事をCSVの1行分のタプルに変換"""
+        return (
+            article.date,
+            article.handle_name,
+            article.title,
+            article.genre or "",
+            article.summary or "",
+            article.url,
+        )
+
+    @classmethod
+    @contextmanager
+    def open_stream(cls, output_path: str) -> Iterator[Callable[[Article], None]]:
+        """
+        記事情報を1件ずつCSVファイルに出力
+
+        ファイルは最初の記事を書き込む時点で作成するため、記事が1件もなければ何も出力しない。
+        書き込むたびにファイルへフラッシュするため、処理が途中で中断されても
+        それまでに書き込んだ記事は残る
+
+        Args:
+            output_path: 出力CSVのパス
+
+        Yields:
+            記事を1件書き込む関数
+        """
+        f: TextIO | None = None
+        writer: Any = None
+
+        def write_one(article: Article) -> None:
+            nonlocal f, writer
+            if f is None:
+                Path(output_path).parent.mkdir(parents=True, exist_ok=True)
+                f = cls._open(output_path)
+                writer = csv.writer(f)
+                writer.writerow(cls.headers)
+            writer.writerow(cls._to_row(article))
+            f.flush()
+
+        try:
+            yield write_one
+        finally:
+            if f is not None:
+                f.close()
@@ -0,0 +1,20 @@
+import aiohttp
+
+
+def create_session() -> aiohttp.ClientSession:
+    """
+    スクレイパーとコンテンツ取得で共有するHTTPセッションを生成
+
+    同じホスト（Qiita, Zennなど）への接続をキープアライブで使い回し、
+    TLSハンドシェイクを減らす
+
+    Returns:
+        生成したセッション。クローズは呼び出し側の責任とする
+    """
+    connector = aiohttp.TCPConnector(
+        limit=100, limit_per_host=10, ttl_dns_cache=300, keepalive_timeout=60
+    )
+    # 応答が途中で止まった接続を早めに切れるよう、全体の上限とは別に
+    # 接続の確立と1回の読み込みごとの待ち時間にも上限を設ける
+    timeout = aiohttp.ClientTimeout(total=30, sock_connect=5, sock_read=10)
+    return aiohttp.ClientSession(connector=connector, timeout=timeout)
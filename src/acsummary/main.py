@@ -1,58 +1,164 @@
 import asyncio
+from collections.abc import Callable
+from contextlib import AsyncExitStack
 import logging
 from pathlib import Path
 
 import click
 from rich.progress import Progress, SpinnerColumn, TextColumn, TimeElapsedColumn
 
-from .ai_processor import process_articles
-from .content_processor import ContentProcessor
+from .ai_processor import create_analyzer, process_batch
+from .analysis_cache import AnalysisCache
+from .content_processor import ContentProcessor, DefaultContentFetcher
 from .csv_writer import CSVWriter
+from .http_session import create_session
 from .models import Article
+from .page_cache import PageCache
 from .scraper import create_scraper
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# uvloopがインストールされていれば、より高速なイベントループを使う
+try:
+    import uvloop
 
-async def collect_articles(calendar_url: str) -> list[Article]:
+    _loop_factory: Callable[[], asyncio.AbstractEventLoop] | None = (
+        uvloop.new_event_loop
+    )
+except ImportError:
+    _loop_factory = None
+
+
+def _first_exception(group: BaseExceptionGroup) -> BaseException:
     """
-    スクレイパーを使って記事を収集
+    入れ子になった例外グループから最初の例外を取り出す
 
     Args:
-        calendar_url: アドベントカレンダーのURL
+        group: TaskGroupが送出した例外グループ
 
     Returns:
-        収集した記事のリスト
+        最初に発生した例外
     """
-    articles: list[Article] = []
-    scraper = create_scraper(calendar_url)
-    async with scraper:
-        async for article in scraper.scrape_articles():
-            articles.append(article)
-    return articles
-
-
-async def process_content(
-    processor: ContentProcessor, articles: list[Article]
-) -> list[Article]:
+    error: BaseException = group
+    while isinstance(error, BaseExceptionGroup):
+        error = error.exceptions[0]
+    return error
+
+
+async def run_pipeline(
+    calendar_url: str,
+    api_key: str,
+    on_article: Callable[[Article], None],
+    fetch_workers: int = 10,
+    analyze_workers: int = 5,
+    batch_size: int = 5,
+    queue_size: int = 50,
+    cache_dir: Path | None = None,
+) -> int:
     """
-    記事のコンテンツを取得・処理
+    記事の収集・コンテンツ取得・分析をパイプラインで並行して実行
+
+    各段階はキューでつながっており、記事のコンテンツを取得し終えた時点で
+    他の記事の取得を待たずに分析を開始する。
+    分析段階ではその時点でキューに溜まっている記事をまとめて1リクエストで分析する。
+    分析を終えた記事は完了順にon_articleへ渡し、パイプライン内には保持しない
 
     Args:
-        processor: コンテンツ処理に使用するプロセッサ
-        articles: 処理対象の記事リスト
+        calendar_url: アドベントカレンダーのURL
+        api_key: Gemini APIのキー
+        on_article: 分析を終えた記事を1件ずつ受け取るコールバック
+        fetch_workers: コンテンツを取得するワーカー数
+        analyze_workers: 記事を分析するワーカー数
+        batch_size: 1リクエストでまとめて分析する最大記事数
+        queue_size: 各段階の間のキューの最大長
+        cache_dir: キャッシュを保存するディレクトリ。Noneの場合はキャッシュしない
 
     Returns:
-        処理済みの記事リスト
+        分析した記事数
     """
-    processed_articles: list[Article] = []
-    async for article in processor.process_articles(articles):
-        processed_articles.append(article)
-    return processed_articles
-
-
-async def process_calendar(calendar_url: str, output_path: str, api_key: str) -> None:
+    # Noneを終端の合図として各段階のワーカーに流す
+    scraped: asyncio.Queue[Article | None] = asyncio.Queue(maxsize=queue_size)
+    fetched: asyncio.Queue[Article | None] = asyncio.Queue(maxsize=queue_size)
+    count = 0
+
+    async with AsyncExitStack() as stack:
+        cache = (
+            await stack.enter_async_context(
+                AnalysisCache(cache_dir / "analysis_cache.sqlite")
+            )
+            if cache_dir
+            else None
+        )
+        page_cache = (
+            await stack.enter_async_context(PageCache(cache_dir / "page_cache.sqlite"))
+            if cache_dir
+            else None
+        )
+        analyzer = create_analyzer(api_key, cache)
+        # カレンダーの取得と記事の取得で1つのコネクションプールを共有する
+        session = await stack.enter_async_context(create_session())
+        processor = await stack.enter_async_context(
+            ContentProcessor(DefaultContentFetcher(session))
+        )
+
+        # 終端の合図は各段階が正常に終わった場合のみ流す。
+        # 失敗した場合はTaskGroupが残りの段階をキャンセルする
+        async def produce() -> None:
+            async with create_scraper(calendar_url, session, page_cache) as scraper:
+                async for article in scraper.scrape_articles():
+                    await scraped.put(article)
+            for _ in range(fetch_workers):
+                await scraped.put(None)
+
+        async def fetch() -> None:
+            while (article := await scraped.get()) is not None:
+                await fetched.put(await processor.process_article(article))
+
+        async def fetch_all() -> None:
+            async with asyncio.TaskGroup() as group:
+                for _ in range(fetch_workers):
+                    group.create_task(fetch())
+            for _ in range(analyze_workers):
+                await fetched.put(None)
+
+        async def analyze() -> None:
+            nonlocal count
+            while (article := await fetched.get()) is not None:
+                # 既に取得済みの記事があればまとめて分析する
+                batch = [article]
+                finished = False
+                while len(batch) < batch_size and not fetched.empty():
+                    if (next_article := fetched.get_nowait()) is None:
+                        finished = True
+                        break
+                    batch.append(next_article)
+
+                await process_batch(analyzer, batch)
+                for analyzed in batch:
+                    on_article(analyzed)
+                count += len(batch)
+                if finished:
+                    break
+
+        # いずれかの段階が失敗した時点で他の段階をキャンセルし、
+        # キューが詰まったまま待ち続けないようにする
+        try:
+            async with asyncio.TaskGroup() as group:
+                group.create_task(produce())
+                group.create_task(fetch_all())
+                for _ in range(analyze_workers):
+                    group.create_task(analyze())
+        except* Exception as failures:
+            # 呼び出し側が例外の型で扱えるよう、最初に発生した例外をそのまま伝える
+            raise _first_exception(failures) from None
+
+    return count
+
+
+async def process_calendar(
+    calendar_url: str, output_path: str, api_key: str, cache_dir: Path | None = None
+) -> None:
     """
     アドベントカレンダーの処理メイン関数
 
@@ -60,6 +166,7 @@ async def process_calendar(calendar_url: str, output_path: str, api_key: str) ->
         calendar_url: アドベントカレンダーのURL
         output_path: 出力CSVのパス
         api_key: Gemini APIのキー
+        cache_dir: キャッシュを保存するディレクトリ。Noneの場合はキャッシュしない
     """
     try:
         with Progress(
@@ -67,31 +174,17 @@ async def process_calendar(calendar_url: str, output_path: str, api_key: str) ->
             TextColumn("[progress.description]{task.description}"),
             TimeElapsedColumn(),
         ) as progress:
-            # 記事の収集
-            progress.add_task(description="記事を収集中...", total=None)
-            articles = await collect_articles(calendar_url)
-
-            if not articles:
+            # 記事の収集・コンテンツの取得・AI処理を行い、分析を終えた記事から順にCSVへ出力
+            progress.add_task(description="記事を収集・分析中...", total=None)
+            with CSVWriter.open_stream(output_path) as write_one:
+                count = await run_pipeline(
+                    calendar_url, api_key, write_one, cache_dir=cache_dir
+                )
+
+            if not count:
                 logger.warning("記事が見つかりませんでした")
                 return
 
-            # コンテンツの取得・処理
-            progress.add_task(description="記事のコンテンツを取得中...", total=None)
-            processor = ContentProcessor()
-            articles_with_content = await process_content(processor, articles)
-
-            # AI処理
-            progress.add_task(description="記事を分析中...", total=None)
-            await process_articles(api_key, articles_with_content)
-
-            # CSV出力用のディレクトリを作成
-            output_path_path = Path(output_path)
-            output_path_path.parent.mkdir(parents=True, exist_ok=True)
-
-            # CSV出力
-            progress.add_task(description="CSVに出力中...", total=None)
-            CSVWriter.write_articles(articles_with_content, output_path)
-
             logger.info(f"処理が完了しました。出力先: {output_path}")
 
     except Exception as e:
@@ -103,7 +196,17 @@ async def process_calendar(calendar_url: str, output_path: str, api_key: str) ->
 @click.argument("calendar_url", type=str)
 @click.argument("output_path", type=str)
 @click.option("--api-key", required=True, help="Gemini API Key")
-def main(calendar_url: str, output_path: str, api_key: str) -> None:
+@click.option(
+    "--cache-dir",
+    type=click.Path(file_okay=False, path_type=Path),
+    default=".acsummary_cache",
+    show_default=True,
+    help="Directory for cached pages and analysis results",
+)
+@click.option("--no-cache", is_flag=True, help="Disable caching")
+def main(
+    calendar_url: str, output_path: str, api_key: str, cache_dir: Path, no_cache: bool
+) -> None:
     """
     アドベントカレンダーの記事を要約してCSVに出力
 
@@ -111,9 +214,16 @@ def main(calendar_url: str, output_path: str, api_key: str) -> None:
         calendar_url: アドベントカレンダーのURL
         output_path: 出力CSVのパス
         api_key: Gemini APIのキー
+        cache_dir: キャッシュを保存するディレクトリ
+        no_cache: キャッシュを使用しない場合はTrue
     """
     try:
-        asyncio.run(process_calendar(calendar_url, output_path, api_key))
+        asyncio.run(
+            process_calendar(
+                calendar_url, output_path, api_key, None if no_cache else cache_dir
+            ),
+            loop_factory=_loop_factory,
+        )
     except Exception as e:
         logger.error(f"予期しないエラーが発生しました: {e}")
         raise click.ClickException(str(e))
@@ -0,0 +1,58 @@
+from typing import NamedTuple
+
+from .sqlite_store import SQLiteStore
+
+
+class CachedPage(NamedTuple):
+    """キャッシュしたページと、条件付きリクエストに使う検証情報"""
+
+    etag: str | None
+    last_modified: str | None
+    body: str
+
+
+class PageCache(SQLiteStore):
+    """取得済みのページをSQLiteに保存し、条件付きリクエストで再取得を省くキャッシュ"""
+
+    _schema = (
+        "CREATE TABLE IF NOT EXISTS pages"
+        " (url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, body TEXT)"
+    )
+
+    async def get(self, url: str) -> CachedPage | None:
+        """
+        ページをキャッシュから取得
+
+        Args:
+            url: ページのURL
+
+        Returns:
+            キャッシュしたページ。キャッシュにない場合はNone
+
+        Raises:
+            RuntimeError: キャッシュが開かれていない場合
+        """
+        async with self._connection.execute(
+            "SELECT etag, last_modified, body FROM pages WHERE url = ?", (url,)
+        ) as cursor:
+            row = await cursor.fetchone()
+        return CachedPage(*row) if row else None
+
+    async def set(self, url: str, page: CachedPage) -> None:
+        """
+        ページをキャッシュに保存
+
+        Args:
+            url: ページのURL
+            page: 保存するページ
+
+        Raises:
+            RuntimeError: キャッシュが開かれていない場合
+        """
+        db = self._connection
+        await db.execute(
+            "INSERT OR REPLACE INTO pages (url, etag, last_modified, body)"
+            " VALUES (?, ?, ?, ?)",
+            (url, *page),
+        )
+        await db.commit()
@@ -1,46 +1,134 @@
 import asyncio
 from dataclasses import dataclass, field
-from datetime import datetime, timedelta
-from collections import deque
 
 
 @dataclass
 class RateLimiter:
     """
-    非同期のレート制限を実装するクラス
+    トークンバケット方式の非同期レート制限を実装するクラス
+
+    リクエスト数(RPM)とトークン数(TPM)を別々のバケットで管理する。
+    レート制限エラーを受けた場合はリクエストレートを下げ、
+    成功するたびに設定値を上限として徐々に元のレートへ戻す
 
     Attributes:
-        requests_per_period: 期間内に許可するリクエスト数
-        period_seconds: 期間（秒）
-        _request_times: リクエスト時刻を保持するdeque
+        requests_per_minute: 1分あたりに許可するリクエスト数の上限
+        tokens_per_minute: 1分あたりに許可するトークン数の上限。Noneの場合は制限しない
+        backoff_factor: レート制限エラー時にリクエストレートへ掛ける係数
+        recovery_factor: 成功時にリクエストレートへ掛ける係数
+        min_requests_per_minute: 縮退時のリクエストレートの下限
+        _current_requests_per_minute: 現在のリクエストレート
+        _available_requests: リクエスト用バケットの残量
+        _available_tokens: トークン用バケットの残量
+        _last_refill: 最後にバケットを補充したイベントループ時刻
+        _lock: 待機中のリクエストを順番に処理するためのロック
     """
 
-    requests_per_period: int
-    period_seconds: float
-    _request_times: deque[datetime] = field(default_factory=deque)
+    requests_per_minute: float
+    tokens_per_minute: float | None = None
+    backoff_factor: float = 0.5
+    recovery_factor: float = 1.05
+    min_requests_per_minute: float = 1.0
+    _current_requests_per_minute: float = field(init=False)
+    _available_requests: float = field(init=False)
+    _available_tokens: float = field(init=False)
+    _last_refill: float | None = field(default=None, init=False)
+    _lock: asyncio.Lock = field(default_factory=asyncio.Lock, init=False)
+
+    def __post_init__(self) -> None:
+        self._current_requests_per_minute = self.requests_per_minute
+        self._available_requests = self.requests_per_minute
+        self._available_tokens = self.tokens_per_minute or 0.0
+
+    @property
+    def current_requests_per_minute(self) -> float:
+        """現在適用されているリクエストレート"""
+        return self._current_requests_per_minute
 
-    async def acquire(self) -> None:
+    def _refill(self, now: float) -> None:
         """
-        レート制限に従ってリクエストの実行を制御
+        経過時間に応じて各バケットを補充
 
-        非同期でリクエストのタイミングを待機し、
-        期間内のリクエスト数が制限を超えないようにする
+        Args:
+            now: 現在のイベントループ時刻
         """
-        now = datetime.now()
+        if self._last_refill is None:
+            self._last_refill = now
+            return
+
+        elapsed = now - self._last_refill
+        self._last_refill = now
 
-        # 期間外のタイムスタンプを削除
-        while self._request_times and now - self._request_times[0] > timedelta(
-            seconds=self.period_seconds
-        ):
-            self._request_times.popleft()
+        self._available_requests = min(
+            self._current_requests_per_minute,
+            self._available_requests
+            + elapsed * self._current_requests_per_minute / 60.0,
+        )
+        if self.tokens_per_minute is not None:
+            self._available_tokens = min(
+                self.tokens_per_minute,
+                self._available_tokens + elapsed * self.tokens_per_minute / 60.0,
+            )
 
-        # 期間内のリクエスト数が制限に達している場合は待機
-        if len(self._request_times) >= self.requests_per_period:
-            wait_time = (
-                self._request_times[0] + timedelta(seconds=self.period_seconds) - now
-            ).total_seconds()
-            if wait_time > 0:
+    def _wait_time(self, tokens: float) -> float:
+        """
+        リクエストを実行できるようになるまでの待ち時間を計算
+
+        Args:
+            tokens: 今回のリクエストで消費するトークン数
+
+        Returns:
+            待ち時間（秒）。待つ必要がない場合は0以下
+        """
+        wait_time = (
+            (1.0 - self._available_requests) * 60.0 / self._current_requests_per_minute
+        )
+        if self.tokens_per_minute is not None:
+            wait_time = max(
+                wait_time,
+                (tokens - self._available_tokens) * 60.0 / self.tokens_per_minute,
+            )
+        return wait_time
+
+    async def acquire(self, tokens: float = 0.0) -> None:
+        """
+        レート制限に従ってリクエストの実行を制御
+
+        バケットの残量が足りない場合は補充されるまで非同期で待機する
+
+        Args:
+            tokens: 今回のリクエストで消費する見込みのトークン数
+        """
+        if self.tokens_per_minute is not None:
+            # バケット容量を超えるリクエストが永久に待たないように丸める
+            tokens = min(tokens, self.tokens_per_minute)
+
+        async with self._lock:
+            loop = asyncio.get_running_loop()
+            self._refill(loop.time())
+            while (wait_time := self._wait_time(tokens)) > 0:
                 await asyncio.sleep(wait_time)
+                self._refill(loop.time())
+
+            self._available_requests -= 1.0
+            if self.tokens_per_minute is not None:
+                self._available_tokens -= tokens
+
+    def on_rate_limit_error(self) -> None:
+        """
+        レート制限エラー（429など）を受けた際にリクエストレートを下げる
+
+        バケットに残っている分も破棄し、直後のバーストを防ぐ
+        """
+        self._current_requests_per_minute = max(
+            self.min_requests_per_minute,
+            self._current_requests_per_minute * self.backoff_factor,
+        )
+        self._available_requests = min(self._available_requests, 0.0)
 
-        # 現在のリクエスト時刻を記録
-        self._request_times.append(datetime.now())
+    def on_success(self) -> None:
+        """リクエスト成功時にリクエストレートを上限まで徐々に戻す"""
+        self._current_requests_per_minute = min(
+            self.requests_per_minute,
+            self._current_requests_per_minute * self.recovery_factor,
+        )
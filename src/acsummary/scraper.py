@@ -1,16 +1,44 @@
+import asyncio
 from abc import ABC
 from datetime import date
 from typing import AsyncIterator, Protocol, Any, NamedTuple
 from urllib.parse import urlparse
 import logging
+import re
 import aiohttp
-from bs4 import BeautifulSoup
+from selectolax.lexbor import LexborHTMLParser
 
+from .http_session import create_session
 from .models import Article
+from .page_cache import CachedPage, PageCache
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# 記事リストの日付表記（"12/1"など）の末尾の日
+_TRAILING_DAY = re.compile(r"(\d+)\s*$")
+
+# カレンダーの各日の日付（年月は固定）。セルごとにdateを生成しないよう事前に作っておく
+_DECEMBER_DATES = tuple(date(2024, 12, day) for day in range(1, 32))
+
+
+def _december_date(day: int) -> date:
+    """
+    カレンダーの日から日付を取得
+
+    Args:
+        day: 日（1〜31）
+
+    Returns:
+        2024年12月の該当日の日付
+
+    Raises:
+        ValueError: 日が範囲外の場合
+    """
+    if not 1 <= day <= len(_DECEMBER_DATES):
+        raise ValueError(f"日付が範囲外です: {day}")
+    return _DECEMBER_DATES[day - 1]
+
 
 class ScrapingError(Exception):
     """スクレイピング処理で発生するエラーを表すカスタム例外"""
@@ -54,19 +82,50 @@ class CalendarScraper(Protocol):
 class BaseCalendarScraper(ABC):
     """カレンダースクレイパーの基底クラス"""
 
-    def __init__(self, calendar_url: str) -> None:
+    def __init__(self, calendar_url: str, page_cache: PageCache | None = None) -> None:
         """
         BaseCalendarScraperの初期化
 
         Args:
             calendar_url: スクレイピング対象のカレンダーURL
+            page_cache: 取得済みのページのキャッシュ。Noneの場合は毎回取得する
         """
         self.calendar_url = calendar_url
+        self.page_cache = page_cache
         self._session: aiohttp.ClientSession | None = None
+        self._owns_session = True
+
+    @classmethod
+    def with_session(
+        cls,
+        calendar_url: str,
+        session: aiohttp.ClientSession,
+        page_cache: PageCache | None = None,
+    ) -> "BaseCalendarScraper":
+        """
+        外部で管理しているセッションを使うスクレイパーを生成
+
+        複数のスクレイパーで1つのセッション（コネクションプール）を共有したい場合に使う。
+        セッションのクローズは呼び出し側の責任とする
+
+        Args:
+            calendar_url: スクレイピング対象のカレンダーURL
+            session: 共有するセッション
+            page_cache: 取得済みのページのキャッシュ。Noneの場合は毎回取得する
+
+        Returns:
+            スクレイパーのインスタンス
+        """
+        scraper = cls(calendar_url, page_cache)
+        scraper._session = session
+        scraper._owns_session = False
+        return scraper
 
     async def __aenter__(self) -> "BaseCalendarScraper":
         """非同期コンテキストマネージャのエントリーポイント"""
-        self._session = aiohttp.ClientSession()
+        if self._session is None:
+            self._session = create_session()
+            self._owns_session = True
         return self
 
     async def __aexit__(
@@ -76,7 +135,7 @@ class BaseCalendarScraper(ABC):
         exc_tb: Any,  # noqa: ANN401
     ) -> None:
         """非同期コンテキストマネージャの終了処理"""
-        if self._session:
+        if self._session and self._owns_session:
             await self._session.close()
             self._session = None
 
@@ -84,6 +143,9 @@ class BaseCalendarScraper(ABC):
         """
         指定URLのページを取得
 
+        ページのキャッシュがある場合はETag・Last-Modifiedで条件付きリクエストを送り、
+        304 Not Modifiedが返ればキャッシュしたページを使う
+
         Args:
             url: 取得対象のURL
 
@@ -97,9 +159,30 @@ class BaseCalendarScraper(ABC):
             raise ScrapingError("セッションが初期化されていません")
 
         try:
-            async with self._session.get(url) as response:
+            cached = await self.page_cache.get(url) if self.page_cache else None
+            headers: dict[str, str] = {}
+            if cached and cached.etag:
+                headers["If-None-Match"] = cached.etag
+            if cached and cached.last_modified:
+                headers["If-Modified-Since"] = cached.last_modified
+
+            async with self._session.get(url, headers=headers) as response:
+                if cached and response.status == 304:
+                    return cached.body
+
                 response.raise_for_status()
-                return await response.text()
+                # 文字コードの推定を避けるため、ヘッダーの文字コード（なければUTF-8）で復号する
+                body = (await response.read()).decode(
+                    response.charset or "utf-8", errors="replace"
+                )
+
+                etag = response.headers.get("ETag")
+                last_modified = response.headers.get("Last-Modified")
+                if self.page_cache and (etag or last_modified):
+                    await self.page_cache.set(
+                        url, CachedPage(etag, last_modified, body)
+                    )
+                return body
         except Exception as e:
             raise ScrapingError(f"ページの取得に失敗しました: {url} - {e}")
 
@@ -115,24 +198,20 @@ class BaseCalendarScraper(ABC):
         """
         try:
             calendar_html = await self._fetch_page(self.calendar_url)
-            entries = self._parse_calendar_page(calendar_html)
+            # パースはCPU処理のため、イベントループを止めないよう別スレッドで実行
+            entries = await asyncio.to_thread(self._parse_calendar_page, calendar_html)
 
+            # エントリーはパースの段階で検証済みのため、記事ごとの例外処理は行わない
             for entry_date, handle_name, url, comment in entries:
-                try:
-                    article = Article(
-                        date=entry_date,
-                        handle_name=handle_name,
-                        title="",  # APIでタイトルを取得予定
-                        genre=None,  # AI処理で設定
-                        summary=comment,  # とりあえずコメントを設定
-                        url=url,
-                        content=None,
-                    )
-                    yield article
-
-                except Exception as e:
-                    logger.error(f"記事のスクレイピングに失敗しました: {url} - {e}")
-                    continue
+                yield Article(
+                    date=entry_date,
+                    handle_name=handle_name,
+                    title="",  # APIでタイトルを取得予定
+                    genre=None,  # AI処理で設定
+                    summary=comment,  # とりあえずコメントを設定
+                    url=url,
+                    content=None,
+                )
 
         except Exception as e:
             raise ScrapingError(f"スクレイピング処理に失敗しました: {e}")
@@ -157,6 +236,15 @@ class BaseCalendarScraper(ABC):
 class AdventarCalendarScraper(BaseCalendarScraper):
     """Adventar形式のカレンダーに対応したスクレイパー"""
 
+    # ページの構造に依存するセレクタはクラス属性にまとめ、すべてのパースで共有する
+    _cell_selector = "td.cell:has(.inner)"
+    _day_selector = ".day"
+    _user_selector = ".userName"
+    _article_selector = "li.item"
+    _article_date_selector = ".date"
+    _article_link_selector = ".link a"
+    _article_comment_selector = ".comment"
+
     def _parse_calendar_page(self, html: str) -> list[ArticleEntry]:
         """
         Adventarのカレンダーページからエントリー情報を抽出
@@ -171,94 +259,82 @@ class AdventarCalendarScraper(BaseCalendarScraper):
             ScrapingError: パースに失敗した場合
         """
         try:
-            soup = BeautifulSoup(html, "html.parser")
-            entries: list[ArticleEntry] = []
-
-            # 各日付のセルを取得
-            cells = soup.find_all("td", class_="cell")
-
-            for cell in cells:
-                # 空のセルはスキップ
-                if "inner" not in str(cell):
-                    continue
-
-                # 日付を取得
-                day_elem = cell.select_one(".day")
-                if not day_elem or not day_elem.text.strip().isdigit():
-                    continue
-
-                day = int(day_elem.text.strip())
-                entry_date = date(2024, 12, day)  # 年月は固定
-
-                # 投稿者名を取得
-                user_elem = cell.select_one(".userName")
-                if not user_elem:
-                    continue
-                handle_name = user_elem.text.strip()
-
-                # 記事URLとコメントを取得（記事が投稿済みの場合）
-                article_info = self._find_article_info(day, soup)
-                if not article_info:
-                    continue
-
-                url, comment = article_info
-                entries.append(
-                    ArticleEntry(
-                        entry_date=entry_date,
-                        handle_name=handle_name,
-                        url=url,
-                        comment=comment,
-                    )
+            tree = LexborHTMLParser(html)
+
+            # 記事リストはセルごとに探し直さないよう日付で索引を作っておく
+            article_by_day = self._index_articles(tree)
+
+            # 各日付のセルのうち、日付・投稿者名・投稿済みの記事がそろったものを抽出
+            # （空のセルはセレクタの段階で除外する）
+            entries = [
+                ArticleEntry(
+                    entry_date=_december_date(day),
+                    handle_name=user_elem.text().strip(),
+                    url=article_info[0],
+                    comment=article_info[1],
                 )
+                for cell in tree.css(self._cell_selector)
+                if (day_elem := cell.css_first(self._day_selector))
+                and (day_text := day_elem.text().strip()).isdecimal()
+                and (user_elem := cell.css_first(self._user_selector))
+                and (article_info := article_by_day.get(day := int(day_text)))
+            ]
 
             return entries
 
         except Exception as e:
             raise ScrapingError(f"カレンダーページのパースに失敗しました: {e}")
 
-    def _find_article_info(
-        self, day: int, soup: BeautifulSoup
-    ) -> tuple[str, str | None] | None:
+    def _index_articles(
+        self, tree: LexborHTMLParser
+    ) -> dict[int, tuple[str, str | None]]:
         """
-        記事の情報（URL、コメント）を取得
+        記事リストから日付ごとの記事の情報（URL、コメント）を取得
 
         Args:
-            day: 対象の日付
-            soup: パース済みのBeautifulSoupオブジェクト
+            tree: パース済みのカレンダーページ
 
         Returns:
-            (URL, コメント)のタプル。記事が未投稿の場合はNone
+            日付をキー、(URL, コメント)のタプルを値とする辞書。
+            同じ日付の記事が複数ある場合は先頭のものを使う
         """
-        # 記事リストから該当日の記事を探す
-        articles = soup.find_all("li", class_="item")
-        for article in articles:
-            date_elem = article.select_one(".date")
+        article_by_day: dict[int, tuple[str, str | None]] = {}
+        for article in tree.css(self._article_selector):
+            date_elem = article.css_first(self._article_date_selector)
             if not date_elem:
                 continue
 
-            # 日付が一致するかチェック
-            article_day = date_elem.text.strip().split("/")[-1]
-            if not article_day.isdigit() or int(article_day) != day:
+            day_match = _TRAILING_DAY.search(date_elem.text())
+            if not day_match:
                 continue
 
             # URLを取得
-            link_elem = article.select_one(".link a")
-            if not link_elem or not link_elem.get("href"):
+            link_elem = article.css_first(self._article_link_selector)
+            if not link_elem or not link_elem.attributes.get("href"):
                 continue
-            url = link_elem["href"]
+            url = link_elem.attributes["href"]
 
             # コメントを取得（任意）
-            comment_elem = article.select_one(".comment")
-            comment = comment_elem.text.strip() if comment_elem else None
+            comment_elem = article.css_first(self._article_comment_selector)
+            comment = comment_elem.text().strip() if comment_elem else None
 
-            return url, comment
+            article_by_day.setdefault(int(day_match.group(1)), (url, comment))
 
-        return None
+        return article_by_day
 
 
 class QiitaCalendarScraper(BaseCalendarScraper):
     """Qiita形式のカレンダーに対応したスクレイパー"""
 
+    # ページの構造に依存するセレクタはクラス属性にまとめ、すべてのパースで共有する
+    _section_selector = "section.style-t7g594"
+    _table_selector = "table.style-1lopqp4"
+    _row_selector = "tbody tr.style-8kv4rj"
+    _cell_selector = "td.style-1dw8kp9"
+    _container_selector = "div.style-176zglo"
+    _article_link_selector = "a.style-14mbwqe"
+    _author_link_selector = "a.style-zfknvc"
+
     def _parse_calendar_page(self, html: str) -> list[ArticleEntry]:
         """
         Qiitaのカレンダーページからエントリー情報を抽出
@@ -273,57 +349,43 @@ class QiitaCalendarScraper(BaseCalendarScraper):
             ScrapingError: パースに失敗した場合
         """
         try:
-            soup = BeautifulSoup(html, "html.parser")
-            entries: list[ArticleEntry] = []
-            calendar_section = soup.find("section", class_="style-t7g594")
+            tree = LexborHTMLParser(html)
+            calendar_section = tree.css_first(self._section_selector)
             if not calendar_section:
                 raise ScrapingError("カレンダーセクションが見つかりませんでした")
 
             # シリーズ1のテーブルを取得
-            calendar_table = calendar_section.find("table", class_="style-1lopqp4")
+            calendar_table = calendar_section.css_first(self._table_selector)
             if not calendar_table:
                 raise ScrapingError("カレンダーテーブルが見つかりませんでした")
 
             # カレンダーのテーブル行を取得（ヘッダー行を除く）
-            calendar_rows = calendar_table.find("tbody").find_all(
-                "tr", class_="style-8kv4rj"
-            )
-
-            for row in calendar_rows:
-                # 各日のセルを処理
-                cells = row.find_all("td", class_="style-1dw8kp9")
-                for cell_index, cell in enumerate(cells, start=1):
-                    # 記事コンテナを取得
-                    article_container = cell.find("div", class_="style-176zglo")
-                    if not article_container:
-                        continue
-
-                    # 記事リンクを取得（これが存在する場合のみ記事が投稿されている）
-                    article_link = article_container.find("a", class_="style-14mbwqe")
-                    if not article_link or not article_link.get("href"):
-                        continue
-
-                    # 投稿者名を取得
-                    author_link = article_container.find("a", class_="style-zfknvc")
-                    if not author_link:
-                        continue
-
-                    handle_name = author_link.text.strip().replace("@", "")
-                    url = article_link["href"]
-                    title = article_link.text.strip()
-
-                    # 日付計算: 行番号と列番号から日付を計算
-                    day = (calendar_rows.index(row) * 7) + cell_index
-                    entry_date = date(2024, 12, day)  # 年月は固定
-
-                    entries.append(
-                        ArticleEntry(
-                            entry_date=entry_date,
-                            handle_name=handle_name,
-                            url=url,
-                            comment=title,  # コメントの代わりにタイトルを使用
-                        )
+            calendar_rows = calendar_table.css(self._row_selector)
+
+            # 各日のセルのうち、記事リンク（投稿済みの場合のみ存在）と投稿者名があるものを抽出。
+            # 日付は行番号と列番号から計算する
+            entries = [
+                ArticleEntry(
+                    entry_date=_december_date((row_index * 7) + cell_index),
+                    handle_name=author_link.text().strip().replace("@", ""),
+                    url=article_link.attributes["href"],
+                    comment=article_link.text().strip(),  # コメントの代わりにタイトルを使用
+                )
+                for row_index, row in enumerate(calendar_rows)
+                for cell_index, cell in enumerate(row.css(self._cell_selector), start=1)
+                if (article_container := cell.css_first(self._container_selector))
+                and (
+                    article_link := article_container.css_first(
+                        self._article_link_selector
                     )
+                )
+                and article_link.attributes.get("href")
+                and (
+                    author_link := article_container.css_first(
+                        self._author_link_selector
+                    )
+                )
+            ]
 
             if not entries:
                 logger.warning("投稿された記事が見つかりませんでした")
@@ -335,12 +397,18 @@ class QiitaCalendarScraper(BaseCalendarScraper):
             raise ScrapingError(f"Qiitaカレンダーページのパースに失敗しました: {e}")
 
 
-def create_scraper(calendar_url: str) -> BaseCalendarScraper:
+def create_scraper(
+    calendar_url: str,
+    session: aiohttp.ClientSession | None = None,
+    page_cache: PageCache | None = None,
+) -> BaseCalendarScraper:
     """
     URLに応じた適切なスクレイパーを生成するファクトリ関数
 
     Args:
         calendar_url: スクレイピング対象のカレンダーURL
+        session: 共有するセッション。Noneの場合はスクレイパーが自前で作成する
+        page_cache: 取得済みのページのキャッシュ。Noneの場合は毎回取得する
 
     Returns:
         適切なCalendarScraperのインスタンス
@@ -350,9 +418,14 @@ def create_scraper(calendar_url: str) -> BaseCalendarScraper:
     """
     domain = urlparse(calendar_url).netloc
 
+    scraper_class: type[BaseCalendarScraper]
     if "adventar.org" in domain:
-        return AdventarCalendarScraper(calendar_url)
+        scraper_class = AdventarCalendarScraper
     elif "qiita.com" in domain:
-        return QiitaCalendarScraper(calendar_url)
+        scraper_class = QiitaCalendarScraper
     else:
         raise ValueError(f"未対応のドメインです: {domain}")
+
+    if session is None:
+        return scraper_class(calendar_url, page_cache)
+    return scraper_class.with_session(calendar_url, session, page_cache)
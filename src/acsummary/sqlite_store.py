@@ -0,0 +1,55 @@
+from pathlib import Path
+from typing import Any, Self
+
+import aiosqlite
+
+
+class SQLiteStore:
+    """
+    SQLiteファイルにデータを保存するキャッシュの基底クラス
+
+    サブクラスは_schemaにテーブルを作成するSQLを定義する
+    """
+
+    _schema: str
+
+    def __init__(self, path: str | Path) -> None:
+        """
+        SQLiteStoreの初期化
+
+        Args:
+            path: キャッシュを保存するSQLiteファイルのパス
+        """
+        self.path = Path(path)
+        self._db: aiosqlite.Connection | None = None
+
+    async def __aenter__(self) -> Self:
+        """非同期コンテキストマネージャのエントリーポイント"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = await aiosqlite.connect(self.path)
+        await self._db.execute(self._schema)
+        await self._db.commit()
+        return self
+
+    async def __aexit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_val: BaseException | None,
+        exc_tb: Any,
+    ) -> None:
+        """非同期コンテキストマネージャの終了処理"""
+        if self._db:
+            await self._db.close()
+            self._db = None
+
+    @property
+    def _connection(self) -> aiosqlite.Connection:
+        """
+        開いているデータベースへの接続
+
+        Raises:
+            RuntimeError: キャッシュが開かれていない場合
+        """
+        if not self._db:
+            raise RuntimeError("キャッシュが初期化されていません")
+        return self._db
@@ -0,0 +1,26 @@
+from collections.abc import Callable
+from datetime import date
+from typing import Any
+
+import pytest
+
+from ..models import Article
+
+
+@pytest.fixture
+def make_article() -> Callable[..., Article]:
+    """日付ごとに異なるURL・タイトルを持つ記事を生成するファクトリ"""
+
+    def _make(day: int = 1, **fields: Any) -> Article:
+        defaults: dict[str, Any] = {
+            "date": date(2024, 12, day),
+            "handle_name": "User",
+            "title": f"Title {day}",
+            "genre": None,
+            "summary": None,
+            "url": f"http://example.com/{day}",
+            "content": None,
+        }
+        return Article(**(defaults | fields))
+
+    return _make
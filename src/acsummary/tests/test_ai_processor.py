@@ -1,14 +1,19 @@
+import sqlite3
 from datetime import date
 import pytest
-from unittest.mock import AsyncMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
+import litellm
 import pytest_asyncio
-from ..ai_processor import ContentAnalyzer, Article
+from ..ai_processor import AnalysisError, ContentAnalyzer, Article, process_batch
+from ..analysis_cache import AnalysisCache
 
 
 @pytest_asyncio.fixture
 async def rate_limiter_mock():
     mock = AsyncMock()
     mock.acquire = AsyncMock()
+    mock.on_success = MagicMock()
+    mock.on_rate_limit_error = MagicMock()
     return mock
 
 
@@ -70,3 +75,193 @@ async def test_analyze_content_exception(analyzer, rate_limiter_mock):
     )
     assert genre == "未分類"
     assert summary == "要約の生成に失敗しました"
+
+
+@pytest.mark.asyncio
+async def test_analyze_content_rate_limit_error(analyzer, rate_limiter_mock):
+    error = litellm.RateLimitError(
+        "rate limited", llm_provider="gemini", model="gemini-2.0-flash-exp"
+    )
+    with (
+        patch("litellm.acompletion", side_effect=error) as mock,
+        patch("asyncio.sleep", new_callable=AsyncMock),
+    ):
+        genre, summary = await analyzer.analyze_content(
+            Article(
+                date=date(2020, 1, 1),
+                title="Title",
+                handle_name="User",
+                genre=None,
+                summary="Some summary",
+                url="http://example.com",
+                content="content",
+            )
+        )
+    assert genre == "未分類"
+    assert summary == "要約の生成に失敗しました"
+    # 再試行の上限まで繰り返し、その都度レートを下げる
+    assert mock.call_count == 6
+    assert rate_limiter_mock.on_rate_limit_error.call_count == 6
+    rate_limiter_mock.on_success.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_analyze_content_retries_transient_error(
+    analyzer, rate_limiter_mock, make_article
+):
+    error = litellm.ServiceUnavailableError(
+        "unavailable", llm_provider="gemini", model="gemini-2.0-flash-exp"
+    )
+    content = '{"genre": "Genre", "summary": "Summary"}'
+    with (
+        patch(
+            "litellm.acompletion", side_effect=[error, _make_response(content)]
+        ) as mock,
+        patch("asyncio.sleep", new_callable=AsyncMock),
+    ):
+        result = await analyzer.analyze_content(make_article(1, content="content"))
+
+    assert result == ("Genre", "Summary")
+    assert mock.call_count == 2
+    assert rate_limiter_mock.acquire.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_process_batch_does_not_fan_out_on_rate_limit(
+    analyzer, rate_limiter_mock, make_article
+):
+    error = litellm.RateLimitError(
+        "rate limited", llm_provider="gemini", model="gemini-2.0-flash-exp"
+    )
+    articles = [make_article(day, content="content") for day in range(1, 6)]
+    with (
+        patch("litellm.acompletion", side_effect=error) as mock,
+        patch("asyncio.sleep", new_callable=AsyncMock),
+    ):
+        await process_batch(analyzer, articles)
+
+    # 一括分析の再試行分のみで、記事ごとの分析にはフォールバックしない
+    assert mock.call_count == 6
+    assert all(article.genre == "未分類" for article in articles)
+    assert all(article.summary == "要約の生成に失敗しました" for article in articles)
+
+
+def _make_response(content: str) -> MagicMock:
+    response = MagicMock()
+    response.choices[0].message.content = content
+    return response
+
+
+@pytest.mark.asyncio
+async def test_analyze_batch_maps_results_by_index(analyzer, make_article):
+    content = (
+        '{"results": ['
+        '{"index": 2, "genre": "G2", "summary": "S2"},'
+        '{"index": 1, "genre": "G1", "summary": "S1"}'
+        "]}"
+    )
+    with patch("litellm.acompletion", return_value=_make_response(content)) as mock:
+        results = await analyzer.analyze_batch(
+            [make_article(1, content="content"), make_article(2, content="content")]
+        )
+
+    assert results == [("G1", "S1"), ("G2", "S2")]
+    mock.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_analyze_batch_missing_result(analyzer, make_article):
+    content = '{"results": [{"index": 1, "genre": "G1", "summary": "S1"}]}'
+    with patch("litellm.acompletion", return_value=_make_response(content)):
+        with pytest.raises(AnalysisError):
+            await analyzer.analyze_batch(
+                [make_article(1, content="content"), make_article(2, content="content")]
+            )
+
+
+@pytest.mark.asyncio
+async def test_process_batch_falls_back_to_single_analysis(analyzer, make_article):
+    articles = [make_article(1, content="content"), make_article(2, content="content")]
+    with (
+        patch.object(analyzer, "analyze_batch", side_effect=AnalysisError("error")),
+        patch.object(
+            analyzer, "analyze_content", return_value=("Genre", "Summary")
+        ) as mock_analyze,
+    ):
+        await process_batch(analyzer, articles)
+
+    assert mock_analyze.call_count == 2
+    assert all(article.genre == "Genre" for article in articles)
+
+
+def test_clean_html_content_extracts_text(analyzer):
+    html = "<html><body><p>Hello</p><script>var x;</script><p>World</p></body></html>"
+    assert analyzer._clean_html_content(html) == "Hello World"
+    assert analyzer._clean_html_content("") == ""
+
+
+def test_clean_html_content_returns_plain_text_as_is(analyzer):
+    analyzer.content_size_max = 10
+    assert analyzer._clean_html_content("plain  text\n") == "plain  tex"
+
+
+def test_clean_html_content_stops_at_limit(analyzer):
+    analyzer.content_size_max = 10
+    analyzer.feed_chunk_size = 16
+    html = "<p>" + "a" * 100 + "</p>" * 1000
+    assert analyzer._clean_html_content(html) == "a" * 10
+
+
+@pytest.mark.asyncio
+async def test_analyze_content_uses_cache(rate_limiter_mock, tmp_path, make_article):
+    article = make_article(1, content="content")
+    async with AnalysisCache(tmp_path / "cache.sqlite") as cache:
+        analyzer = ContentAnalyzer("dummy_api_key", rate_limiter_mock, cache)
+        content = '{"genre": "Genre", "summary": "Summary"}'
+        with patch("litellm.acompletion", return_value=_make_response(content)) as mock:
+            first = await analyzer.analyze_content(article)
+            second = await analyzer.analyze_content(article)
+
+    assert first == second == ("Genre", "Summary")
+    mock.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_analyze_batch_skips_cached_articles(
+    rate_limiter_mock, tmp_path, make_article
+):
+    articles = [make_article(1, content="content"), make_article(2, content="content")]
+    async with AnalysisCache(tmp_path / "cache.sqlite") as cache:
+        await cache.set(articles[0], "Cached", "Cached summary")
+        analyzer = ContentAnalyzer("dummy_api_key", rate_limiter_mock, cache)
+        content = '{"results": [{"index": 1, "genre": "G2", "summary": "S2"}]}'
+        with patch("litellm.acompletion", return_value=_make_response(content)) as mock:
+            results = await analyzer.analyze_batch(articles)
+
+        assert results == [("Cached", "Cached summary"), ("G2", "S2")]
+        assert "Title 1" not in mock.call_args.kwargs["messages"][0]["content"]
+        assert await cache.get(articles[1]) == ("G2", "S2")
+
+
+@pytest.mark.asyncio
+async def test_cache_errors_do_not_stop_analysis(rate_limiter_mock, make_article):
+    cache = MagicMock()
+    cache.get = AsyncMock(side_effect=sqlite3.OperationalError("database is locked"))
+    cache.set = AsyncMock(side_effect=sqlite3.OperationalError("database is locked"))
+    analyzer = ContentAnalyzer("dummy_api_key", rate_limiter_mock, cache)
+
+    single = '{"genre": "Genre", "summary": "Summary"}'
+    batch = '{"results": [{"index": 1, "genre": "G1", "summary": "S1"}]}'
+    with patch(
+        "litellm.acompletion",
+        side_effect=[_make_response(single), _make_response(batch)],
+    ):
+        content_result = await analyzer.analyze_content(
+            make_article(1, content="content")
+        )
+        batch_result = await analyzer.analyze_batch(
+            [make_article(2, content="content")]
+        )
+
+    assert content_result == ("Genre", "Summary")
+    assert batch_result == [("G1", "S1")]
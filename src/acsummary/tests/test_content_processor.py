@@ -0,0 +1,191 @@
+import aiohttp
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from ..content_processor import (
+    ContentProcessor,
+    DefaultContentFetcher,
+    FetchedPage,
+    _clean_content,
+    _extract_content,
+)
+
+
+def test_extract_content_prefers_h1_and_article():
+    html = """
+    <html>
+      <head><title>Page Title</title></head>
+      <body>
+        <h1> Article Title </h1>
+        <div class="content">sidebar</div>
+        <article>
+          <p>First paragraph.</p>
+          <script>var x = 1;</script>
+          <p>Second paragraph.</p>
+        </article>
+      </body>
+    </html>
+    """
+    title, content = _extract_content(html)
+
+    assert title == "Article Title"
+    assert "First paragraph." in content
+    assert "Second paragraph." in content
+    assert "var x" not in content
+    assert "sidebar" not in content
+
+
+def test_extract_content_falls_back_to_og_title_and_content_div():
+    html = """
+    <html>
+      <head><meta property="og:title" content="OG Title"></head>
+      <body>
+        <div class="content-wrapper">wrapper</div>
+        <div class="post entry-content">Body text</div>
+      </body>
+    </html>
+    """
+    title, content = _extract_content(html)
+
+    assert title == "OG Title"
+    assert content.strip() == "Body text"
+
+
+def test_extract_content_accepts_xml_declaration():
+    html = (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<html xmlns="http://www.w3.org/1999/xhtml">'
+        "<body><h1>XHTML Title</h1><article>XHTML body</article></body></html>"
+    )
+    title, content = _extract_content(html)
+
+    assert title == "XHTML Title"
+    assert content == "XHTML body"
+
+
+@pytest.mark.parametrize(
+    ("html", "charset"),
+    [
+        # HTTPヘッダーで指定された文字コード
+        ("<html><body><h1>日本語</h1></body></html>".encode("euc_jp"), "EUC-JP"),
+        # lxmlが知らない別名で指定された文字コード
+        ("<html><body><h1>日本語</h1></body></html>".encode("cp932"), "windows-31j"),
+        # 解釈できない文字コード名の場合は文書内の宣言に従う
+        (
+            '<html><head><meta charset="Shift_JIS"></head>'
+            "<body><h1>日本語</h1></body></html>".encode("shift_jis"),
+            "x-unknown",
+        ),
+        # 解釈できない文字コード名で、宣言もない場合はUTF-8
+        ("<html><body><h1>日本語</h1></body></html>".encode(), "x-unknown"),
+        # meta charsetのみで宣言された文字コード
+        (
+            '<html><head><meta charset="Shift_JIS"></head>'
+            "<body><h1>日本語</h1></body></html>".encode("shift_jis"),
+            None,
+        ),
+        # 宣言がない場合はUTF-8
+        ("<html><body><h1>日本語</h1></body></html>".encode(), None),
+        # XML宣言付きのXHTML
+        (
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            "<html><body><h1>日本語</h1></body></html>".encode(),
+            None,
+        ),
+    ],
+)
+def test_extract_content_decodes_bytes(html, charset):
+    title, _ = _extract_content(html, charset)
+
+    assert title == "日本語"
+
+
+def test_clean_content_collapses_whitespace_and_truncates():
+    assert _clean_content("  a \n\n b\tc  ") == "a b c"
+    assert len(_clean_content("x" * 10000)) == 8000
+
+
+@pytest.mark.asyncio
+async def test_process_article_sets_title_and_content(make_article):
+    fetcher = AsyncMock()
+    fetcher.fetch.return_value = FetchedPage(
+        b"<html><body><h1>Title</h1><article>body</article></body></html>", None
+    )
+
+    async with ContentProcessor(fetcher) as processor:
+        article = await processor.process_article(make_article(1))
+
+    assert article.title == "Title"
+    assert article.content == "body"
+
+
+@pytest.mark.asyncio
+async def test_process_article_keeps_failed_article(make_article):
+    fetcher = AsyncMock()
+    fetcher.fetch.side_effect = Exception("Error")
+    async with ContentProcessor(fetcher) as processor:
+        article = await processor.process_article(make_article(1))
+
+    assert article.content is None
+
+
+@pytest.mark.asyncio
+async def test_process_article_requires_context(make_article):
+    with pytest.raises(RuntimeError):
+        await ContentProcessor(AsyncMock()).process_article(make_article(1))
+
+
+@pytest.mark.asyncio
+async def test_process_article_retries_transient_error(make_article):
+    fetcher = AsyncMock()
+    fetcher.fetch.side_effect = [
+        aiohttp.ClientConnectionError("Error"),
+        FetchedPage(b"<html><body><article>body</article></body></html>", None),
+    ]
+    with patch("asyncio.sleep", new_callable=AsyncMock):
+        async with ContentProcessor(fetcher) as processor:
+            article = await processor.process_article(make_article(1))
+
+    assert article.content == "body"
+    assert fetcher.fetch.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_process_article_does_not_retry_client_error(make_article):
+    fetcher = AsyncMock()
+    fetcher.fetch.side_effect = aiohttp.ClientResponseError(
+        request_info=MagicMock(), history=(), status=404
+    )
+    async with ContentProcessor(fetcher) as processor:
+        article = await processor.process_article(make_article(1))
+
+    assert article.content is None
+    assert fetcher.fetch.call_count == 1
+
+
+@pytest.mark.asyncio
+async def test_default_fetcher_stops_reading_at_size_limit():
+    chunks = [b"a" * 4, b"b" * 4, b"c" * 4]
+
+    async def iter_chunked(size):
+        for chunk in chunks:
+            yield chunk
+
+    response = MagicMock()
+    response.charset = "utf-8"
+    response.content.iter_chunked = iter_chunked
+    session = MagicMock()
+    session.get.return_value.__aenter__ = AsyncMock(return_value=response)
+    session.get.return_value.__aexit__ = AsyncMock(return_value=None)
+
+    fetcher = DefaultContentFetcher()
+    fetcher._session = session
+    fetcher.content_size_max = 6
+
+    assert await fetcher.fetch("http://example.com") == FetchedPage(b"aaaabb", "utf-8")
+
+
+@pytest.mark.asyncio
+async def test_processor_uses_spawn_without_forkserver():
+    with patch("multiprocessing.get_all_start_methods", return_value=["spawn"]):
+        async with ContentProcessor(AsyncMock()) as processor:
+            assert processor._pool._mp_context.get_start_method() == "spawn"
@@ -0,0 +1,25 @@
+from ..csv_writer import CSVWriter
+
+
+def test_open_stream_writes_rows_as_they_arrive(tmp_path, make_article):
+    output_path = tmp_path / "out" / "articles.csv"
+    with CSVWriter.open_stream(str(output_path)) as write_one:
+        write_one(make_article(1, genre="Genre"))
+        # 書き込み直後にファイルへ反映されている
+        assert "Title 1" in output_path.read_text(encoding="utf-8-sig")
+        write_one(make_article(2, genre="Genre"))
+
+    lines = output_path.read_text(encoding="utf-8-sig").splitlines()
+    assert lines == [
+        "日付,ハンドルネーム,タイトル,ジャンル,要約,URL",
+        "2024-12-01,User,Title 1,Genre,,http://example.com/1",
+        "2024-12-02,User,Title 2,Genre,,http://example.com/2",
+    ]
+
+
+def test_open_stream_creates_no_file_without_articles(tmp_path):
+    output_path = tmp_path / "articles.csv"
+    with CSVWriter.open_stream(str(output_path)):
+        pass
+
+    assert not output_path.exists()
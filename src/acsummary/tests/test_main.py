@@ -0,0 +1,114 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from ..main import run_pipeline
+from ..models import Article
+from ..scraper import ScrapingError
+
+
+def _make_scraper(articles: list[Article], error: Exception | None = None):
+    async def scrape_articles():
+        for article in articles:
+            yield article
+        if error:
+            raise error
+
+    scraper = MagicMock()
+    scraper.__aenter__ = AsyncMock(return_value=scraper)
+    scraper.__aexit__ = AsyncMock(return_value=None)
+    scraper.scrape_articles = scrape_articles
+    return scraper
+
+
+def _make_processor():
+    async def process_article(article):
+        article.content = "content"
+        return article
+
+    processor = MagicMock()
+    processor.__aenter__ = AsyncMock(return_value=processor)
+    processor.__aexit__ = AsyncMock(return_value=None)
+    processor.process_article = process_article
+    return processor
+
+
+async def _analyze(analyzer, batch):
+    for article in batch:
+        article.genre = "Genre"
+
+
+@pytest.mark.asyncio
+async def test_run_pipeline_processes_all_articles(make_article):
+    articles = [make_article(day) for day in (3, 1, 2)]
+    with (
+        patch("acsummary.main.create_scraper", return_value=_make_scraper(articles)),
+        patch("acsummary.main.ContentProcessor", return_value=_make_processor()),
+        patch("acsummary.main.create_analyzer"),
+        patch("acsummary.main.process_batch", side_effect=_analyze) as mock_batch,
+    ):
+        results: list[Article] = []
+        count = await run_pipeline("http://fake.url", "dummy_api_key", results.append)
+
+    assert count == 3
+    assert sorted(article.date.day for article in results) == [1, 2, 3]
+    assert all(article.content == "content" for article in results)
+    assert all(article.genre == "Genre" for article in results)
+    assert sum(len(call.args[1]) for call in mock_batch.call_args_list) == 3
+
+
+@pytest.mark.asyncio
+async def test_run_pipeline_propagates_scraping_error(make_article):
+    scraper = _make_scraper([make_article(1)], ScrapingError("Error"))
+    with (
+        patch("acsummary.main.create_scraper", return_value=scraper),
+        patch("acsummary.main.ContentProcessor", return_value=_make_processor()),
+        patch("acsummary.main.create_analyzer"),
+        patch("acsummary.main.process_batch", side_effect=_analyze),
+    ):
+        with pytest.raises(ScrapingError):
+            await run_pipeline("http://fake.url", "dummy_api_key", lambda _: None)
+
+
+@pytest.mark.asyncio
+async def test_run_pipeline_cancels_stages_when_output_fails(make_article):
+    articles = [make_article(day) for day in range(1, 26)]
+
+    def on_article(article):
+        raise OSError("disk full")
+
+    with (
+        patch("acsummary.main.create_scraper", return_value=_make_scraper(articles)),
+        patch("acsummary.main.ContentProcessor", return_value=_make_processor()),
+        patch("acsummary.main.create_analyzer"),
+        patch("acsummary.main.process_batch", side_effect=_analyze),
+    ):
+        with pytest.raises(OSError):
+            await asyncio.wait_for(
+                run_pipeline(
+                    "http://fake.url",
+                    "dummy_api_key",
+                    on_article,
+                    fetch_workers=2,
+                    analyze_workers=1,
+                    queue_size=1,
+                ),
+                timeout=5,
+            )
+
+
+@pytest.mark.asyncio
+async def test_run_pipeline_shares_one_session():
+    with (
+        patch(
+            "acsummary.main.create_scraper", return_value=_make_scraper([])
+        ) as mock_scraper,
+        patch(
+            "acsummary.main.ContentProcessor", return_value=_make_processor()
+        ) as mock_processor,
+        patch("acsummary.main.create_analyzer"),
+        patch("acsummary.main.process_batch", side_effect=_analyze),
+    ):
+        await run_pipeline("http://fake.url", "dummy_api_key", lambda _: None)
+
+    fetcher = mock_processor.call_args.args[0]
+    assert mock_scraper.call_args.args[1] is fetcher._session
@@ -0,0 +1,64 @@
+import pytest
+from unittest.mock import AsyncMock, patch
+from ..rate_limiter import RateLimiter
+
+
+@pytest.mark.asyncio
+async def test_acquire_within_capacity_does_not_wait():
+    limiter = RateLimiter(requests_per_minute=3)
+    with patch("asyncio.sleep", new_callable=AsyncMock) as mock_sleep:
+        for _ in range(3):
+            await limiter.acquire()
+    mock_sleep.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_acquire_waits_when_bucket_is_empty():
+    limiter = RateLimiter(requests_per_minute=60)
+    limiter._available_requests = 0.0
+
+    def refill(_: float) -> None:
+        limiter._available_requests = 1.0
+
+    with patch("asyncio.sleep", new_callable=AsyncMock) as mock_sleep:
+        mock_sleep.side_effect = refill
+        await limiter.acquire()
+    # 60RPMなので1リクエスト分の補充には約1秒かかる
+    mock_sleep.assert_called_once()
+    assert mock_sleep.call_args.args[0] == pytest.approx(1.0, abs=0.01)
+
+
+@pytest.mark.asyncio
+async def test_acquire_waits_for_tokens():
+    limiter = RateLimiter(requests_per_minute=60, tokens_per_minute=600)
+    limiter._available_tokens = 0.0
+
+    def refill(_: float) -> None:
+        limiter._available_tokens = 600.0
+
+    with patch("asyncio.sleep", new_callable=AsyncMock) as mock_sleep:
+        mock_sleep.side_effect = refill
+        await limiter.acquire(tokens=10)
+    # 600TPMなので10トークン分の補充には約1秒かかる
+    mock_sleep.assert_called_once()
+    assert mock_sleep.call_args.args[0] == pytest.approx(1.0, abs=0.01)
+    assert limiter._available_tokens == pytest.approx(590.0)
+
+
+def test_on_rate_limit_error_halves_rate():
+    limiter = RateLimiter(requests_per_minute=10, min_requests_per_minute=2)
+    limiter.on_rate_limit_error()
+    assert limiter.current_requests_per_minute == 5
+    limiter.on_rate_limit_error()
+    limiter.on_rate_limit_error()
+    assert limiter.current_requests_per_minute == 2
+
+
+def test_on_success_recovers_up_to_ceiling():
+    limiter = RateLimiter(requests_per_minute=10)
+    limiter.on_rate_limit_error()
+    limiter.on_success()
+    assert limiter.current_requests_per_minute == pytest.approx(5.25)
+    for _ in range(100):
+        limiter.on_success()
+    assert limiter.current_requests_per_minute == 10
@@ -1,9 +1,16 @@
+import aiohttp
 import pytest
 import pytest_asyncio
 from datetime import date
-from unittest.mock import patch
-from ..scraper import AdventarCalendarScraper, ScrapingError
+from unittest.mock import AsyncMock, MagicMock, patch
+from ..scraper import (
+    AdventarCalendarScraper,
+    QiitaCalendarScraper,
+    ScrapingError,
+    create_scraper,
+)
 from ..models import Article
+from ..page_cache import CachedPage, PageCache
 
 
 @pytest_asyncio.fixture
@@ -40,3 +47,137 @@ async def test_scrape_articles_scraping_error(scraper):
         with pytest.raises(ScrapingError):
             async for _ in scraper.scrape_articles():
                 pass
+
+
+ADVENTAR_HTML = """
+<table>
+  <tr>
+    <td class="cell"><div class="inner">
+      <div class="day">1</div><span class="userName">alice</span>
+    </div></td>
+    <td class="cell"><div class="inner">
+      <div class="day">2</div><span class="userName">bob</span>
+    </div></td>
+    <td class="cell"></td>
+  </tr>
+</table>
+<ul>
+  <li class="item">
+    <div class="date">12/1</div>
+    <div class="link"><a href="http://example.com/1">Article 1</a></div>
+    <div class="comment"> first </div>
+  </li>
+</ul>
+"""
+
+QIITA_HTML = """
+<section class="style-t7g594">
+  <table class="style-1lopqp4"><tbody>
+    <tr class="style-8kv4rj">
+      <td class="style-1dw8kp9"><div class="style-176zglo">
+        <a class="style-14mbwqe" href="http://example.com/1">Title 1</a>
+        <a class="style-zfknvc">@alice</a>
+      </div></td>
+      <td class="style-1dw8kp9"><div class="style-176zglo">
+        <a class="style-zfknvc">@bob</a>
+      </div></td>
+    </tr>
+    <tr class="style-8kv4rj">
+      <td class="style-1dw8kp9"><div class="style-176zglo">
+        <a class="style-14mbwqe" href="http://example.com/8">Title 8</a>
+        <a class="style-zfknvc">@carol</a>
+      </div></td>
+    </tr>
+  </tbody></table>
+</section>
+"""
+
+
+def test_adventar_parse_calendar_page():
+    entries = AdventarCalendarScraper("http://fake.url")._parse_calendar_page(
+        ADVENTAR_HTML
+    )
+
+    assert entries == [
+        (date(2024, 12, 1), "alice", "http://example.com/1", "first"),
+    ]
+
+
+def test_qiita_parse_calendar_page():
+    entries = QiitaCalendarScraper("http://fake.url")._parse_calendar_page(QIITA_HTML)
+
+    assert entries == [
+        (date(2024, 12, 1), "alice", "http://example.com/1", "Title 1"),
+        (date(2024, 12, 8), "carol", "http://example.com/8", "Title 8"),
+    ]
+
+
+def test_qiita_parse_calendar_page_without_section():
+    with pytest.raises(ScrapingError):
+        QiitaCalendarScraper("http://fake.url")._parse_calendar_page("<html></html>")
+
+
+@pytest.mark.asyncio
+async def test_shared_session_is_not_closed():
+    async with aiohttp.ClientSession() as session:
+        async with AdventarCalendarScraper.with_session(
+            "http://fake.url", session
+        ) as scraper:
+            assert scraper._session is session
+
+        assert not session.closed
+
+
+def test_create_scraper_with_session():
+    session = MagicMock(spec=aiohttp.ClientSession)
+    scraper = create_scraper("https://qiita.com/advent-calendar/2024/x", session)
+
+    assert isinstance(scraper, QiitaCalendarScraper)
+    assert scraper._session is session
+
+
+def _make_session(status: int, text: str = "", headers: dict | None = None):
+    response = MagicMock()
+    response.status = status
+    response.headers = headers or {}
+    response.charset = "utf-8"
+    response.read = AsyncMock(return_value=text.encode())
+    response.raise_for_status = MagicMock()
+    session = MagicMock(spec=aiohttp.ClientSession)
+    session.get.return_value.__aenter__ = AsyncMock(return_value=response)
+    session.get.return_value.__aexit__ = AsyncMock(return_value=None)
+    return session
+
+
+@pytest.mark.asyncio
+async def test_fetch_page_stores_validators(tmp_path):
+    session = _make_session(200, "<html></html>", {"ETag": '"abc"'})
+    async with PageCache(tmp_path / "pages.sqlite") as cache:
+        scraper = AdventarCalendarScraper.with_session(
+            "http://fake.url", session, cache
+        )
+        body = await scraper._fetch_page("http://fake.url")
+
+        assert body == "<html></html>"
+        assert await cache.get("http://fake.url") == CachedPage(
+            '"abc"', None, "<html></html>"
+        )
+
+
+@pytest.mark.asyncio
+async def test_fetch_page_uses_cache_on_not_modified(tmp_path):
+    session = _make_session(304)
+    async with PageCache(tmp_path / "pages.sqlite") as cache:
+        await cache.set(
+            "http://fake.url", CachedPage('"abc"', "Mon, 02 Dec 2024", "cached")
+        )
+        scraper = AdventarCalendarScraper.with_session(
+            "http://fake.url", session, cache
+        )
+        body = await scraper._fetch_page("http://fake.url")
+
+    assert body == "cached"
+    assert session.get.call_args.kwargs["headers"] == {
+        "If-None-Match": '"abc"',
+        "If-Modified-Since": "Mon, 02 Dec 2024",
+    }